@@ -3,8 +3,10 @@ import time
 import socket
 import requests
 import grpc
+import os
 import sys
 import json
+import struct
 import statistics
 
 # Import gRPC generated code
@@ -19,32 +21,76 @@ except ImportError:
     import user_service_pb2
     import user_service_pb2_grpc
 
-def benchmark_socket(iterations=50):
-    """Benchmark Socket performance"""
+# Socket server framing (see python-socket-lab/protocol.py): type byte + 4-byte length
+SOCKET_FRAME_HEADER = struct.Struct('!BI')
+SOCKET_FRAME_MESSAGE = 1
+SOCKET_FRAME_ERROR = 2
+# never wait on the socket server forever, e.g. while queued for a worker
+SOCKET_TIMEOUT = 5
+# a second socket server on a Unix domain socket, for the TCP vs UDS comparison:
+#   SERVER_HOST=unix:/tmp/socket-lab.sock python python-socket-lab/server.py
+SOCKET_UNIX_PATH = os.environ.get('SOCKET_UNIX_PATH', '/tmp/socket-lab.sock')
+
+def socket_connect(transport='TCP'):
+    """Open a connection to the socket server over TCP or the Unix domain socket"""
+    if transport == 'UDS':
+        sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        sock.settimeout(SOCKET_TIMEOUT)
+        sock.connect(SOCKET_UNIX_PATH)
+    else:
+        sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        sock.settimeout(SOCKET_TIMEOUT)
+        sock.connect(('localhost', 8080))
+    return sock
+
+def socket_recv_exact(sock, size):
+    """Read exactly size bytes from a socket"""
+    data = b''
+    while len(data) < size:
+        chunk = sock.recv(size - len(data))
+        if not chunk:
+            raise ConnectionError("Socket server closed the connection")
+        data += chunk
+    return data
+
+def socket_request(sock, message):
+    """Send one framed message and return the framed response payload"""
+    payload = message.encode('utf-8')
+    sock.sendall(SOCKET_FRAME_HEADER.pack(SOCKET_FRAME_MESSAGE, len(payload)) + payload)
+    frame_type, length = SOCKET_FRAME_HEADER.unpack(socket_recv_exact(sock, SOCKET_FRAME_HEADER.size))
+    response = socket_recv_exact(sock, length)
+    if frame_type == SOCKET_FRAME_ERROR:
+        # e.g. the server turned the connection away because it was busy
+        raise ConnectionError(f"Socket server error: {response.decode('utf-8')}")
+    return response
+
+def benchmark_socket(iterations=50, transport='TCP', persistent=False):
+    """Benchmark Socket performance (a new connection per request unless persistent)"""
+    label = f"{transport}, persistent" if persistent else transport
     print(f"\n{'='*50}")
-    print(f"Socket Performance Test ({iterations} iterations)")
+    print(f"Socket Performance Test ({label}, {iterations} iterations)")
     print('='*50)
     
     times = []
     errors = 0
+    sock = None
     
     for i in range(iterations):
         try:
             start = time.time()
             
-            # Create socket connection
-            sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
-            sock.connect(('localhost', 8080))
+            # Create socket connection (persistent: only the first time, or after a failure)
+            if sock is None:
+                sock = socket_connect(transport)
             
             # Send simple text message (server converts to uppercase)
             message = 'performance test'
-            sock.send(message.encode('utf-8'))
-            
-            # Receive response
-            response = sock.recv(1024)
+            response = socket_request(sock, message)
             
             # Close connection
-            sock.close()
+            if not persistent:
+                sock.close()
+                sock = None
             
             end = time.time()
             elapsed = (end - start) * 1000  # Convert to milliseconds
@@ -56,6 +102,12 @@ def benchmark_socket(iterations=50):
         except Exception as e:
             errors += 1
             print(f"Error #{errors}: {e}")
+            if sock is not None:
+                sock.close()
+                sock = None
+    
+    if sock is not None:
+        sock.close()
     
     if times:
         avg_time = statistics.mean(times)
@@ -63,7 +115,7 @@ def benchmark_socket(iterations=50):
         max_time = max(times)
         std_dev = statistics.stdev(times) if len(times) > 1 else 0
         
-        print(f"\nSocket Results:")
+        print(f"\nSocket ({label}) Results:")
         print(f"  Average response time: {avg_time:.2f}ms")
         print(f"  Min: {min_time:.2f}ms")
         print(f"  Max: {max_time:.2f}ms")
@@ -74,6 +126,58 @@ def benchmark_socket(iterations=50):
     
     return None
 
+def benchmark_socket_concurrency(connections=1000):
+    """Hold many Socket connections open at once and measure request latency across them"""
+    print(f"\n{'='*50}")
+    print(f"Socket Concurrency Test ({connections} concurrent connections)")
+    print('='*50)
+    
+    socks = []
+    times = []
+    errors = 0
+    
+    # Open every connection first so they are all held by the server at once
+    connect_start = time.time()
+    for i in range(connections):
+        try:
+            socks.append(socket.create_connection(('localhost', 8080), timeout=SOCKET_TIMEOUT))
+        except OSError as e:
+            errors += 1
+            if errors == 1:
+                print(f"Connect error: {e}")
+    connect_elapsed = (time.time() - connect_start) * 1000
+    print(f"Opened {len(socks)}/{connections} connections in {connect_elapsed:.0f}ms")
+    
+    # One request per open connection while all the others stay idle
+    for sock in socks:
+        try:
+            start = time.time()
+            socket_request(sock, 'performance test')
+            times.append((time.time() - start) * 1000)
+        except Exception as e:
+            # rejected (busy) and timed-out requests are errors, not timings
+            errors += 1
+            if errors == 1:
+                print(f"Request error: {e}")
+    
+    for sock in socks:
+        sock.close()
+    
+    if len(times) > 1:
+        avg_time = statistics.mean(times)
+        p99_time = statistics.quantiles(times, n=100)[98]
+        
+        print(f"\nSocket Concurrency Results:")
+        print(f"  Average response time: {avg_time:.3f}ms")
+        print(f"  p99: {p99_time:.3f}ms")
+        print(f"  Max: {max(times):.3f}ms")
+        print(f"  Errors: {errors}")
+        print("  (run once per SERVER_MODE to compare server modes)")
+        
+        return avg_time
+    
+    return None
+
 def benchmark_rest(iterations=50):
     """Benchmark REST API performance"""
     print(f"\n{'='*50}")
@@ -174,7 +278,7 @@ def benchmark_grpc(iterations=50):
     
     return None
 
-def compare_results(socket_time, rest_time, grpc_time):
+def compare_results(socket_time, rest_time, grpc_time, uds_time=None, persistent_time=None):
     """Compare results from all three methods"""
     print(f"\n{'='*50}")
     print("Performance Comparison Summary")
@@ -183,6 +287,10 @@ def compare_results(socket_time, rest_time, grpc_time):
     results = []
     if socket_time is not None:
         results.append(('Socket', socket_time))
+    if uds_time is not None:
+        results.append(('Socket UDS', uds_time))
+    if persistent_time is not None:
+        results.append(('Socket persistent', persistent_time))
     if rest_time is not None:
         results.append(('REST', rest_time))
     if grpc_time is not None:
@@ -200,12 +308,12 @@ def compare_results(socket_time, rest_time, grpc_time):
     
     for rank, (method, avg_time) in enumerate(results, 1):
         if rank == 1:
-            print(f"{rank}. {method:<10} {avg_time:>8.2f}ms (fastest)")
+            print(f"{rank}. {method:<17} {avg_time:>8.2f}ms (fastest)")
         else:
             fastest_time = results[0][1]
             ratio = avg_time / fastest_time
             slower_percent = (ratio - 1) * 100
-            print(f"{rank}. {method:<10} {avg_time:>8.2f}ms ({slower_percent:.0f}% slower)")
+            print(f"{rank}. {method:<17} {avg_time:>8.2f}ms ({slower_percent:.0f}% slower)")
 
 
 def main():
@@ -229,13 +337,30 @@ def main():
     socket_time = benchmark_socket(iterations)
     time.sleep(1)  # Brief pause between tests
     
+    # same requests on one reused connection, without the handshake in every sample
+    persistent_time = benchmark_socket(iterations, persistent=True)
+    time.sleep(1)  # Brief pause between tests
+    
+    # TCP vs Unix domain socket, only when a second server listens on SOCKET_UNIX_PATH
+    uds_time = None
+    if os.path.exists(SOCKET_UNIX_PATH):
+        uds_time = benchmark_socket(iterations, transport='UDS')
+        if socket_time is not None and uds_time is not None:
+            print(f"\nSocket TCP vs UDS: {socket_time:.2f}ms vs {uds_time:.2f}ms")
+        time.sleep(1)  # Brief pause between tests
+    
+    # e.g. `python benchmark.py 10000` or SOCKET_CONNECTIONS=10000
+    connections = int(sys.argv[1]) if len(sys.argv) > 1 else int(os.environ.get('SOCKET_CONNECTIONS', 1000))
+    benchmark_socket_concurrency(connections)
+    time.sleep(1)  # Brief pause between tests
+    
     rest_time = benchmark_rest(iterations)
     time.sleep(1)  # Brief pause between tests
     
     grpc_time = benchmark_grpc(iterations)
     
     # Compare results
-    compare_results(socket_time, rest_time, grpc_time)
+    compare_results(socket_time, rest_time, grpc_time, uds_time, persistent_time)
 
 if __name__ == '__main__':
     main()
\ No newline at end of file
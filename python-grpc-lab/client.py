@@ -70,6 +70,21 @@ class UserServiceClient:
             print(f"gRPC Error: {e.details()}")
             return []
     
+    def get_newest_users(self, limit=10):
+        """Get the most recently created users"""
+        print(f"\n[Get Newest Users] Limit: {limit}")
+        try:
+            request = user_service_pb2.NewestUsersRequest(limit=limit)
+            response = self.stub.GetNewestUsers(request)
+            
+            print(f"Newest users retrieved successfully, {response.count} users:")
+            for i, user in enumerate(response.users, 1):
+                print(f"   {i}. ID: {user.id}, Name: {user.name}, Created at: {user.created_at}")
+            return response.users
+        except grpc.RpcError as e:
+            print(f"gRPC Error: {e.details()}")
+            return []
+    
     def update_user(self, user_id, name=None, email=None):
         """Update user"""
         print(f"\n[Update User] ID: {user_id}")
@@ -254,19 +269,38 @@ class UserServiceClient:
                     email=duplicate_email
                 )
                 response2 = self.stub.CreateUser(request2)
-                print("Should have thrown INVALID_ARGUMENT error for duplicate email")
+                print("Should have thrown ALREADY_EXISTS error for duplicate email")
                 test_results.append(False)
             else:
                 print("Failed to create initial user for duplicate test")
                 test_results.append(False)
         except grpc.RpcError as e:
-            if e.code() == grpc.StatusCode.INVALID_ARGUMENT:
+            if e.code() == grpc.StatusCode.ALREADY_EXISTS:
                 print(f"✓ Correctly handled duplicate email error: {e.details()}")
                 test_results.append(True)
             else:
                 print(f"✗ Wrong error code: {e.code()}")
                 test_results.append(False)
         
+        # Test 5: Update to another user's email
+        try:
+            timestamp = str(int(time.time()))
+            first = self.stub.CreateUser(user_service_pb2.CreateUserRequest(
+                name='First User', email=f'first{timestamp}@example.com'))
+            second = self.stub.CreateUser(user_service_pb2.CreateUserRequest(
+                name='Second User', email=f'second{timestamp}@example.com'))
+            request = user_service_pb2.UpdateUserRequest(id=second.user.id, email=first.user.email)
+            response = self.stub.UpdateUser(request)
+            print("Should have thrown ALREADY_EXISTS error for a taken email")
+            test_results.append(False)
+        except grpc.RpcError as e:
+            if e.code() == grpc.StatusCode.ALREADY_EXISTS:
+                print(f"✓ Correctly handled taken email on update: {e.details()}")
+                test_results.append(True)
+            else:
+                print(f"✗ Wrong error code: {e.code()}")
+                test_results.append(False)
+        
         passed = sum(test_results)
         total = len(test_results)
         print(f"\nError handling tests: {passed}/{total} passed")
@@ -278,6 +312,38 @@ class UserServiceClient:
             print("Some error handling tests failed")
             return False
     
+    def test_created_range(self):
+        """Test creation time range and newest-first queries"""
+        print("\n[Test 4] Created range test")
+        created_ids = []
+        try:
+            since = int(time.time())
+            for i in range(3):
+                response = self.stub.CreateUser(user_service_pb2.CreateUserRequest(
+                    name=f'Range Test {i}', email=f'range{i}-{since}@test.com'))
+                created_ids.append(response.user.id)
+            
+            response = self.stub.GetNewestUsers(user_service_pb2.NewestUsersRequest(limit=3))
+            newest = [user.id for user in response.users]
+            print(f"Call: GetNewestUsers(limit=3) -> {newest}")
+            
+            response = self.stub.GetUsersCreated(user_service_pb2.CreatedRangeRequest(since=since))
+            in_range = [user.id for user in response.users]
+            print(f"Call: GetUsersCreated(since={since}) -> {len(in_range)} users")
+            
+            if newest == created_ids[::-1] and in_range[-3:] == created_ids:
+                print("Created range test passed")
+                return True
+            print(f"Expected {created_ids[::-1]} newest first and {created_ids} at the end of the range")
+            return False
+        
+        except grpc.RpcError as e:
+            print(f"RPC call failed: {e.code()} - {e.details()}")
+            return False
+        finally:
+            for user_id in created_ids:
+                self.stub.DeleteUser(user_service_pb2.UserRequest(id=user_id))
+    
     def cleanup(self):
         """Clean up test data"""
         if self.test_user_id:
@@ -301,6 +367,7 @@ class UserServiceClient:
             ('Service Method Invocation', self.test_service_method_invocation),
             ('Data Serialization/Deserialization', self.test_data_serialization_deserialization),
             ('Error Handling', self.test_error_handling),
+            ('Created Range', self.test_created_range),
         ]
         
         passed = 0
@@ -331,7 +398,8 @@ def interactive_mode():
     print("3. list - Get all users")
     print("4. update <id> <name> <email> - Update user")
     print("5. delete <id> - Delete user")
-    print("6. quit - Exit")
+    print("6. newest [limit] - Most recently created users")
+    print("7. quit - Exit")
     print("=" * 30)
     
     try:
@@ -355,6 +423,8 @@ def interactive_mode():
                 client.update_user(command[1], command[2], command[3])
             elif action == 'delete' and len(command) > 1:
                 client.delete_user(command[1])
+            elif action == 'newest':
+                client.get_newest_users(int(command[1]) if len(command) > 1 else 10)
             else:
                 print("Invalid command or insufficient parameters, please try again")
                 
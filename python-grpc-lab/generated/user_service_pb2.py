@@ -24,7 +24,7 @@ _sym_db = _symbol_database.Default()
 
 
 
-DESCRIPTOR = _descriptor_pool.Default().AddSerializedFile(b'\n\x12user_service.proto\"C\n\x04User\x12\n\n\x02id\x18\x01 \x01(\t\x12\x0c\n\x04name\x18\x02 \x01(\t\x12\r\n\x05\x65mail\x18\x03 \x01(\t\x12\x12\n\ncreated_at\x18\x04 \x01(\t\"\x07\n\x05\x45mpty\"\x19\n\x0bUserRequest\x12\n\n\x02id\x18\x01 \x01(\t\"0\n\x11\x43reateUserRequest\x12\x0c\n\x04name\x18\x01 \x01(\t\x12\r\n\x05\x65mail\x18\x02 \x01(\t\"<\n\x11UpdateUserRequest\x12\n\n\x02id\x18\x01 \x01(\t\x12\x0c\n\x04name\x18\x02 \x01(\t\x12\r\n\x05\x65mail\x18\x03 \x01(\t\"E\n\x0cUserResponse\x12\x0f\n\x07success\x18\x01 \x01(\x08\x12\x0f\n\x07message\x18\x02 \x01(\t\x12\x13\n\x04user\x18\x03 \x01(\x0b\x32\x05.User\"@\n\x08UserList\x12\x0f\n\x07success\x18\x01 \x01(\x08\x12\x14\n\x05users\x18\x02 \x03(\x0b\x32\x05.User\x12\r\n\x05\x63ount\x18\x03 \x01(\x05\"1\n\rDeleteResonse\x12\x0f\n\x07success\x18\x01 \x01(\x08\x12\x0f\n\x07message\x18\x02 \x01(\t2\xe5\x01\n\x0bUserService\x12 \n\x0bGetAllUsers\x12\x06.Empty\x1a\t.UserList\x12&\n\x07GetUser\x12\x0c.UserRequest\x1a\r.UserResponse\x12/\n\nCreateUser\x12\x12.CreateUserRequest\x1a\r.UserResponse\x12/\n\nUpdateUser\x12\x12.UpdateUserRequest\x1a\r.UserResponse\x12*\n\nDeleteUser\x12\x0c.UserRequest\x1a\x0e.DeleteResonseb\x06proto3')
+DESCRIPTOR = _descriptor_pool.Default().AddSerializedFile(b'\n\x12user_service.proto\"C\n\x04User\x12\n\n\x02id\x18\x01 \x01(\t\x12\x0c\n\x04name\x18\x02 \x01(\t\x12\r\n\x05\x65mail\x18\x03 \x01(\t\x12\x12\n\ncreated_at\x18\x04 \x01(\t\"\x07\n\x05\x45mpty\"\x19\n\x0bUserRequest\x12\n\n\x02id\x18\x01 \x01(\t\"0\n\x11\x43reateUserRequest\x12\x0c\n\x04name\x18\x01 \x01(\t\x12\r\n\x05\x65mail\x18\x02 \x01(\t\"<\n\x11UpdateUserRequest\x12\n\n\x02id\x18\x01 \x01(\t\x12\x0c\n\x04name\x18\x02 \x01(\t\x12\r\n\x05\x65mail\x18\x03 \x01(\t\"X\n\x13\x43reatedRangeRequest\x12\r\n\x05since\x18\x01 \x01(\x03\x12\r\n\x05until\x18\x02 \x01(\x03\x12\r\n\x05limit\x18\x03 \x01(\x05\x12\x14\n\x0cnewest_first\x18\x04 \x01(\x08\"#\n\x12NewestUsersRequest\x12\r\n\x05limit\x18\x01 \x01(\x05\"E\n\x0cUserResponse\x12\x0f\n\x07success\x18\x01 \x01(\x08\x12\x0f\n\x07message\x18\x02 \x01(\t\x12\x13\n\x04user\x18\x03 \x01(\x0b\x32\x05.User\"@\n\x08UserList\x12\x0f\n\x07success\x18\x01 \x01(\x08\x12\x14\n\x05users\x18\x02 \x03(\x0b\x32\x05.User\x12\r\n\x05\x63ount\x18\x03 \x01(\x05\"1\n\rDeleteResonse\x12\x0f\n\x07success\x18\x01 \x01(\x08\x12\x0f\n\x07message\x18\x02 \x01(\t2\xcb\x02\n\x0bUserService\x12 \n\x0bGetAllUsers\x12\x06.Empty\x1a\t.UserList\x12&\n\x07GetUser\x12\x0c.UserRequest\x1a\r.UserResponse\x12/\n\nCreateUser\x12\x12.CreateUserRequest\x1a\r.UserResponse\x12/\n\nUpdateUser\x12\x12.UpdateUserRequest\x1a\r.UserResponse\x12*\n\nDeleteUser\x12\x0c.UserRequest\x1a\x0e.DeleteResonse\x12\x32\n\x0fGetUsersCreated\x12\x14.CreatedRangeRequest\x1a\t.UserList\x12\x30\n\x0eGetNewestUsers\x12\x13.NewestUsersRequest\x1a\t.UserListb\x06proto3')
 
 _globals = globals()
 _builder.BuildMessageAndEnumDescriptors(DESCRIPTOR, _globals)
@@ -41,12 +41,16 @@ if not _descriptor._USE_C_DESCRIPTORS:
   _globals['_CREATEUSERREQUEST']._serialized_end=175
   _globals['_UPDATEUSERREQUEST']._serialized_start=177
   _globals['_UPDATEUSERREQUEST']._serialized_end=237
-  _globals['_USERRESPONSE']._serialized_start=239
-  _globals['_USERRESPONSE']._serialized_end=308
-  _globals['_USERLIST']._serialized_start=310
-  _globals['_USERLIST']._serialized_end=374
-  _globals['_DELETERESONSE']._serialized_start=376
-  _globals['_DELETERESONSE']._serialized_end=425
-  _globals['_USERSERVICE']._serialized_start=428
-  _globals['_USERSERVICE']._serialized_end=657
+  _globals['_CREATEDRANGEREQUEST']._serialized_start=239
+  _globals['_CREATEDRANGEREQUEST']._serialized_end=327
+  _globals['_NEWESTUSERSREQUEST']._serialized_start=329
+  _globals['_NEWESTUSERSREQUEST']._serialized_end=364
+  _globals['_USERRESPONSE']._serialized_start=366
+  _globals['_USERRESPONSE']._serialized_end=435
+  _globals['_USERLIST']._serialized_start=437
+  _globals['_USERLIST']._serialized_end=501
+  _globals['_DELETERESONSE']._serialized_start=503
+  _globals['_DELETERESONSE']._serialized_end=552
+  _globals['_USERSERVICE']._serialized_start=555
+  _globals['_USERSERVICE']._serialized_end=886
 # @@protoc_insertion_point(module_scope)
@@ -62,6 +62,16 @@ class UserServiceStub(object):
                 request_serializer=user__service__pb2.UserRequest.SerializeToString,
                 response_deserializer=user__service__pb2.DeleteResonse.FromString,
                 _registered_method=True)
+        self.GetUsersCreated = channel.unary_unary(
+                '/UserService/GetUsersCreated',
+                request_serializer=user__service__pb2.CreatedRangeRequest.SerializeToString,
+                response_deserializer=user__service__pb2.UserList.FromString,
+                _registered_method=True)
+        self.GetNewestUsers = channel.unary_unary(
+                '/UserService/GetNewestUsers',
+                request_serializer=user__service__pb2.NewestUsersRequest.SerializeToString,
+                response_deserializer=user__service__pb2.UserList.FromString,
+                _registered_method=True)
 
 
 class UserServiceServicer(object):
@@ -97,6 +107,20 @@ class UserServiceServicer(object):
         context.set_details('Method not implemented!')
         raise NotImplementedError('Method not implemented!')
 
+    def GetUsersCreated(self, request, context):
+        """users created in [since, until) (epoch seconds), oldest first
+        """
+        context.set_code(grpc.StatusCode.UNIMPLEMENTED)
+        context.set_details('Method not implemented!')
+        raise NotImplementedError('Method not implemented!')
+
+    def GetNewestUsers(self, request, context):
+        """the most recently created users, newest first
+        """
+        context.set_code(grpc.StatusCode.UNIMPLEMENTED)
+        context.set_details('Method not implemented!')
+        raise NotImplementedError('Method not implemented!')
+
 
 def add_UserServiceServicer_to_server(servicer, server):
     rpc_method_handlers = {
@@ -125,6 +149,16 @@ def add_UserServiceServicer_to_server(servicer, server):
                     request_deserializer=user__service__pb2.UserRequest.FromString,
                     response_serializer=user__service__pb2.DeleteResonse.SerializeToString,
             ),
+            'GetUsersCreated': grpc.unary_unary_rpc_method_handler(
+                    servicer.GetUsersCreated,
+                    request_deserializer=user__service__pb2.CreatedRangeRequest.FromString,
+                    response_serializer=user__service__pb2.UserList.SerializeToString,
+            ),
+            'GetNewestUsers': grpc.unary_unary_rpc_method_handler(
+                    servicer.GetNewestUsers,
+                    request_deserializer=user__service__pb2.NewestUsersRequest.FromString,
+                    response_serializer=user__service__pb2.UserList.SerializeToString,
+            ),
     }
     generic_handler = grpc.method_handlers_generic_handler(
             'UserService', rpc_method_handlers)
@@ -270,3 +304,57 @@ class UserService(object):
             timeout,
             metadata,
             _registered_method=True)
+
+    @staticmethod
+    def GetUsersCreated(request,
+            target,
+            options=(),
+            channel_credentials=None,
+            call_credentials=None,
+            insecure=False,
+            compression=None,
+            wait_for_ready=None,
+            timeout=None,
+            metadata=None):
+        return grpc.experimental.unary_unary(
+            request,
+            target,
+            '/UserService/GetUsersCreated',
+            user__service__pb2.CreatedRangeRequest.SerializeToString,
+            user__service__pb2.UserList.FromString,
+            options,
+            channel_credentials,
+            insecure,
+            call_credentials,
+            compression,
+            wait_for_ready,
+            timeout,
+            metadata,
+            _registered_method=True)
+
+    @staticmethod
+    def GetNewestUsers(request,
+            target,
+            options=(),
+            channel_credentials=None,
+            call_credentials=None,
+            insecure=False,
+            compression=None,
+            wait_for_ready=None,
+            timeout=None,
+            metadata=None):
+        return grpc.experimental.unary_unary(
+            request,
+            target,
+            '/UserService/GetNewestUsers',
+            user__service__pb2.NewestUsersRequest.SerializeToString,
+            user__service__pb2.UserList.FromString,
+            options,
+            channel_credentials,
+            insecure,
+            call_credentials,
+            compression,
+            wait_for_ready,
+            timeout,
+            metadata,
+            _registered_method=True)
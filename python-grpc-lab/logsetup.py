@@ -0,0 +1,53 @@
+import atexit
+import logging
+import logging.handlers
+import os
+import queue
+import random
+
+# Request-path logging for the socket, REST and gRPC servers. Each lab is its
+# own Docker build context, so this file is kept identical in all three.
+#
+#   LOG_LEVEL        DEBUG shows per-request lines, INFO (default) only lifecycle
+#                    events; a disabled level costs one isEnabledFor() check
+#   LOG_SAMPLE_RATE  fraction of records below WARNING that are kept (default 1.0)
+#
+# Records are handed to a queue and written to stderr by a background thread,
+# so a request thread never blocks on the terminal.
+LOG_FORMAT = '%(asctime)s %(levelname)s %(processName)s %(name)s: %(message)s'
+
+
+class SampleFilter(logging.Filter):
+    """keep only a fraction of records below WARNING, warnings and errors always pass"""
+
+    def __init__(self, rate):
+        super().__init__()
+        self.rate = rate
+
+    def filter(self, record):
+        return record.levelno >= logging.WARNING or random.random() < self.rate
+
+
+def setup_logging(level=None, sample_rate=None):
+    """route all logging through a queue drained by a background thread; returns the listener"""
+    level = (level or os.environ.get('LOG_LEVEL', 'INFO')).upper()
+    if sample_rate is None:
+        sample_rate = float(os.environ.get('LOG_SAMPLE_RATE', 1.0))
+
+    log_queue = queue.SimpleQueue()
+    output = logging.StreamHandler()
+    output.setFormatter(logging.Formatter(LOG_FORMAT))
+    listener = logging.handlers.QueueListener(log_queue, output)
+
+    queue_handler = logging.handlers.QueueHandler(log_queue)
+    if sample_rate < 1:
+        queue_handler.addFilter(SampleFilter(sample_rate))
+
+    root = logging.getLogger()
+    root.setLevel(level)
+    root.handlers[:] = [queue_handler]
+
+    listener.start()
+    # flush whatever is still queued when the process exits
+    atexit.register(listener.stop)
+    return listener
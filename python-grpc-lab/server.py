@@ -1,21 +1,33 @@
 from cmath import polar
+import logging
+import threading
+from bisect import bisect_left, insort
 import time
 import grpc
 from concurrent import futures
 from generated import user_service_pb2
 from generated import user_service_pb2_grpc
-from grpc_interceptor.exceptions import NotFound,InvalidArgument
+from grpc_interceptor.exceptions import AlreadyExists,NotFound,InvalidArgument
 from grpc_interceptor import ExceptionToStatusInterceptor
+from logsetup import setup_logging
+
+logger = logging.getLogger('grpc-server')
+
 # realize the service
 class UserService(user_service_pb2_grpc.UserServiceServicer):
     def __init__(self):
         self.users = {}
         self.next_id = 1
+        # (created, numeric id) of every user in order, for creation time range queries
+        self.by_created = []
+        # RPCs run on a thread pool: every check-then-modify of users (and next_id)
+        # happens under this lock, and readers copy what they need under it
+        self.lock = threading.Lock()
     
     
     def CreateUser(self, request, context):
         # create new user
-        print(f"Creating user: (name: {request.name}, email: {request.email})")
+        logger.debug("Creating user: (name: %s, email: %s)", request.name, request.email)
         # validate request
         if not request.name or not request.email:
             raise InvalidArgument("Name and email are required")
@@ -23,28 +35,34 @@ class UserService(user_service_pb2_grpc.UserServiceServicer):
         if '@' not in request.email:
             raise InvalidArgument("Invalid email format")
         
-        for user in self.users.values():
-            if user['email'].lower() == request.email.lower():
-                raise InvalidArgument("Email already exists")
+        with self.lock:
+            for user in self.users.values():
+                if user['email'].lower() == request.email.lower():
+                    raise AlreadyExists("Email already exists")
                 
-        try:  
             user_id = str(self.next_id)
             self.next_id += 1
             
             # store user data
+            created = int(time.time())
+            created_at = time.strftime('%Y-%m-%d %H:%M:%S', time.localtime(created))
             self.users[user_id] = {
                 'id': user_id,
                 'name': request.name,
                 'email': request.email,
-                'created_at': time.strftime('%Y-%m-%d %H:%M:%S')  
+                'created': created,
+                'created_at': created_at
             }
-            
+            # appends unless the clock stepped back
+            insort(self.by_created, (created, int(user_id)))
+        
+        try:  
             # return created user
             user = user_service_pb2.User(
                 id=user_id,
                 name=request.name,
                 email=request.email,
-                created_at=self.users[user_id]['created_at']
+                created_at=created_at
             )
             
             return user_service_pb2.UserResponse(
@@ -62,13 +80,14 @@ class UserService(user_service_pb2_grpc.UserServiceServicer):
     def GetUser(self, request, context):
         # request is the UserRequest from the client
         # here should return a UserResponse
-        print(f"Fetching user: (id: {request.id})")
+        logger.debug("Fetching user: (id: %s)", request.id)
         user_id = request.id
-        if user_id not in self.users:
-            raise NotFound(f"User with ID {user_id} not found")
-        
-        user = self.users[user_id]
-        print(f"User fetched successfully: {user}")
+        with self.lock:
+            user = self.users.get(user_id)
+            if user is None:
+                raise NotFound(f"User with ID {user_id} not found")
+            user = dict(user)
+        logger.debug("User fetched successfully: %s", user)
         
         # return the user
         user_obj = user_service_pb2.User(
@@ -86,10 +105,12 @@ class UserService(user_service_pb2_grpc.UserServiceServicer):
 
     def GetAllUsers(self, request, context):
         # here should return a UserList
-        print(f"Fetching all users")
+        logger.debug("Fetching all users")
         try:
+            with self.lock:
+                users = [dict(user_data) for user_data in self.users.values()]
             user_list = []
-            for user_id, user_data in self.users.items():
+            for user_data in users:
                 user_obj = user_service_pb2.User(
                     id=user_data['id'],
                     name=user_data['name'],
@@ -111,19 +132,27 @@ class UserService(user_service_pb2_grpc.UserServiceServicer):
             )
     
     def UpdateUser(self, request, context):
-        print(f"Updating user: (id: {request.id})")
+        logger.debug("Updating user: (id: %s)", request.id)
         try:
             user_id = request.id
-            if user_id not in self.users:
-                raise NotFound(f"User with ID {user_id} not found")
-            
-            # update user information
-            if request.name:
-                self.users[user_id]['name'] = request.name
-            if request.email:
-                self.users[user_id]['email'] = request.email
-            
-            user_data = self.users[user_id]
+            with self.lock:
+                if user_id not in self.users:
+                    raise NotFound(f"User with ID {user_id} not found")
+                
+                # update user information
+                # the new email must not belong to another user, checked and
+                # applied under one lock hold like in CreateUser
+                if request.email:
+                    for other_id, user in self.users.items():
+                        if other_id != user_id and user['email'].lower() == request.email.lower():
+                            raise AlreadyExists("Email already exists")
+                
+                if request.name:
+                    self.users[user_id]['name'] = request.name
+                if request.email:
+                    self.users[user_id]['email'] = request.email
+                
+                user_data = dict(self.users[user_id])
             user_obj = user_service_pb2.User(
                 id=user_data['id'],
                 name=user_data['name'],
@@ -136,6 +165,9 @@ class UserService(user_service_pb2_grpc.UserServiceServicer):
                 message="User updated successfully",
                 user=user_obj
             )
+        except AlreadyExists:
+            # a status of its own, not a failed response
+            raise
         except Exception as e:
             return user_service_pb2.UserResponse(
                 success=False,
@@ -144,20 +176,67 @@ class UserService(user_service_pb2_grpc.UserServiceServicer):
             )
     
     def DeleteUser(self, request, context):
-        print(f"Deleting user: (id: {request.id})")
+        logger.debug("Deleting user: (id: %s)", request.id)
         user_id = request.id
-        if user_id not in self.users:
-            raise NotFound(f"User with ID {user_id} not found")
-        
-        # Delete the user
-        deleted_user = self.users.pop(user_id)
-        print(f"User deleted successfully: {deleted_user}")
+        with self.lock:
+            if user_id not in self.users:
+                raise NotFound(f"User with ID {user_id} not found")
+            
+            # Delete the user
+            deleted_user = self.users.pop(user_id)
+            del self.by_created[bisect_left(self.by_created, (deleted_user['created'], int(user_id)))]
+        logger.debug("User deleted successfully: %s", deleted_user)
         
         return user_service_pb2.DeleteResonse(
             success=True,
             message="User deleted successfully"
         )
 
+    def GetUsersCreated(self, request, context):
+        logger.debug("Fetching users created in [%s, %s)", request.since, request.until)
+        if request.limit < 0:
+            raise InvalidArgument("Limit cannot be negative")
+        if request.since and request.until and request.since > request.until:
+            raise InvalidArgument("since cannot be after until")
+        return self.created_range(request.since or None, request.until or None,
+                                  request.limit or None, request.newest_first)
+    
+    def GetNewestUsers(self, request, context):
+        logger.debug("Fetching the %s newest users", request.limit)
+        if request.limit < 0:
+            raise InvalidArgument("Limit cannot be negative")
+        return self.created_range(None, None, request.limit or 10, newest_first=True)
+    
+    def created_range(self, since, until, limit, newest_first):
+        """UserList of at most limit users with since <= created < until, found by binary search"""
+        with self.lock:
+            first = 0 if since is None else bisect_left(self.by_created, (since,))
+            last = len(self.by_created) if until is None else bisect_left(self.by_created, (until,))
+            if newest_first:
+                if limit is not None:
+                    first = max(first, last - limit)
+                keys = reversed(self.by_created[first:last])
+            else:
+                if limit is not None:
+                    last = min(last, first + limit)
+                keys = self.by_created[first:last]
+            users = [dict(self.users[str(user_id)]) for _, user_id in keys]
+        
+        user_list = [
+            user_service_pb2.User(
+                id=user_data['id'],
+                name=user_data['name'],
+                email=user_data['email'],
+                created_at=user_data['created_at']
+            )
+            for user_data in users
+        ]
+        return user_service_pb2.UserList(
+            success=True,
+            users=user_list,
+            count=len(user_list)
+        )
+
 # start the server
 def serve():
     interceptors = [
@@ -171,8 +250,9 @@ def serve():
     # add the port to the server
     server.add_insecure_port(f'[::]:{port}')  
     server.start()
-    print(f"Server started successfully. Listening on [::]:{port}")
+    logger.info("Server started successfully. Listening on [::]:%s", port)
     server.wait_for_termination() # wait for the server to terminate
 
 if __name__ == '__main__':
+    setup_logging()
     serve()
\ No newline at end of file
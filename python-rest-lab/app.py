@@ -1,55 +1,281 @@
-from flask import Flask, jsonify, request
-from models import User, UserManager
-import time
+from flask import Flask, Response, jsonify, request
+from json_provider import DEFAULT_JSON_PROVIDER, json_provider
+from models import (ID_GENERATORS, MemoryStorage, User, UserManager, created_order, matches, page_cursor,
+                    parse_cursor, timestamp)
+from response_cache import ResponseCache
+from search_index import NGRAM
+from sqlite_storage import SQLiteStorage
+from logsetup import setup_logging
+import atexit
+import os
 
 app = Flask(__name__)
+# USER_JSON=stdlib encodes with the json module even when orjson is installed
+app.json = json_provider(os.environ.get('USER_JSON', DEFAULT_JSON_PROVIDER))(app)
 
-user_manager = UserManager()
+# USER_IDS=uuid4 gives new users random ids instead of time-ordered ones
+User.new_id = staticmethod(ID_GENERATORS[os.environ.get('USER_IDS', 'ordered')])
+# USER_CACHE_MB bounds the cache of encoded GET responses (0 turns it off)
+CACHE_BYTES = int(os.environ.get('USER_CACHE_MB', 64)) * 2**20
 
+# GET /api/users pages: limit defaults to this when only a cursor is given, and is capped
+DEFAULT_PAGE_SIZE = 100
+MAX_PAGE_SIZE = 1000
+# streamed responses (stream=ndjson|json) are read and written this many users at a time
+STREAM_BATCH = 1000
+
+
+def use_manager(manager):
+    """serve manager's users, through a new response cache that its changes invalidate"""
+    global user_manager, response_cache
+    user_manager = manager
+    response_cache = ResponseCache(CACHE_BYTES)
+    manager.add_listener(invalidate_responses)
+
+def invalidate_responses(old, new):
+    """drop the cached responses a change makes stale: the full listing and the
+    pages whose span holds the user, the user's own response and the searches
+    that match the user before or after it"""
+    changed = [user for user in (old, new) if user is not None]
+    position = created_order(changed[0])
+    response_cache.invalidate_kind('users', lambda key, value: spans(value[2], position))
+    response_cache.invalidate(('user', changed[0].id))
+    # only the searches filed under a substring of the user are checked
+    terms = set().union(*(search_terms(text.lower()) for user in changed for text in (user.name, user.email)))
+    response_cache.invalidate_terms(terms, lambda key, value: any(
+        matches(user, key[1].lower().strip(), key[2]) for user in changed))
+
+def search_term(query):
+    """the term a search for the lowercased query is cached under: its first
+    NGRAM characters, which every user it matches contains"""
+    return ('search', query[:NGRAM])
+
+def search_terms(text):
+    """the terms of every search that can match lowercased text"""
+    return {('search', text[i:i + n]) for n in range(1, NGRAM + 1) for i in range(len(text) - n + 1)}
+
+def spans(span, position):
+    """whether a listing whose users depend on span, (after, last] in created_order
+    (None for an open end, a span of None for the whole list), holds position"""
+    if span is None:
+        return True
+    after, last = span
+    return (after is None or position > after) and (last is None or position <= last)
+
+# USER_SHARDS partitions the users across independently locked shards
+use_manager(UserManager(MemoryStorage(shards=int(os.environ.get('USER_SHARDS', 1)))))
+
+
+def int_arg(name, default=None):
+    """an integer query parameter, ValueError if it is given but is not an integer"""
+    value = request.args.get(name, '')
+    if not value:
+        return default
+    try:
+        return int(value)
+    except ValueError:
+        raise ValueError(f'Query parameter "{name}" must be an integer')
+
+def fields_arg():
+    """the user fields listed in the fields query parameter (each once, in the
+    order first listed), None for all of them"""
+    value = request.args.get('fields', '')
+    if not value:
+        return None
+    fields = list(dict.fromkeys(field.strip() for field in value.split(',')))
+    unknown = [field for field in fields if field not in User.FIELDS]
+    if unknown:
+        raise ValueError(f'Unknown fields: {", ".join(unknown)} (expected {", ".join(User.FIELDS)})')
+    return fields
+
+def etag(version):
+    """the strong ETag of data at a UserManager version"""
+    return f'{user_manager.epoch}-{version}'
+
+def not_modified(tag):
+    """a 304 response if the request's If-None-Match lists tag, else None"""
+    if request.if_none_match.contains_weak(tag):
+        response = Response(status=304)
+        response.set_etag(tag)
+        return response
+    return None
+
+def with_etag(response, tag):
+    response.set_etag(tag)
+    return response
+
+def cached_response(entry):
+    """the response for a (tag, body, span) entry of the response cache"""
+    tag, body, _ = entry
+    response = Response(body, mimetype='application/json')
+    if tag:
+        response.set_etag(tag)
+    return response
+
+def cache_response(key, response, tag, generation, span=None, terms=()):
+    """tag response (if tag), cache its body and tag under key, return it
+    
+    generation is the response cache's, read before the tag and the users.
+    span is the part of created_order a listing depends on (see spans()),
+    terms are passed on to the cache. The body keeps the timestamp it was
+    encoded with.
+    """
+    if tag:
+        response.set_etag(tag)
+    body = response.get_data()
+    response_cache.put(key, (tag, body, span), len(body), generation, terms)
+    return response
+
+def users_json(users, fields=None):
+    """users as a JSON array"""
+    return '[' + ','.join([user.to_json(fields) for user in users]) + ']'
+
+def success_response(data, status=200, **fields):
+    """a success response with the given fields and data, JSON already encoded
+    (User.to_json or users_json), so users are never turned into dicts"""
+    envelope = app.json.dumps({'status': 'success', **fields, 'timestamp': timestamp()})
+    return app.response_class(f'{envelope[:-1]},"data":{data}}}', status=status, mimetype=app.json.mimetype)
+
+def stream_arg():
+    """the stream query parameter: None, 'ndjson' or 'json'"""
+    value = request.args.get('stream', '').lower()
+    if not value:
+        return None
+    if value not in ('ndjson', 'json'):
+        raise ValueError('Query parameter "stream" must be ndjson or json')
+    return value
+
+def stream_users(users, fields, mode, **extra):
+    """a response writing users (any iterable, consumed as it is sent) in chunks
+    
+    ndjson sends one user object per line. json sends the envelope of the
+    buffered response, with the count after data since it is only known at the
+    end. The first bytes go out before any user is read, and only one batch
+    is held at a time.
+    """
+    def batches():
+        batch = []
+        for user in users:
+            batch.append(user.to_json(fields))
+            if len(batch) == STREAM_BATCH:
+                yield batch
+                batch = []
+        if batch:
+            yield batch
+    
+    def ndjson():
+        for batch in batches():
+            yield '\n'.join(batch) + '\n'
+    
+    def json_array():
+        envelope = app.json.dumps({'status': 'success', **extra, 'timestamp': timestamp()})
+        yield envelope[:-1] + ',"data":['
+        count = 0
+        for batch in batches():
+            yield (',' if count else '') + ','.join(batch)
+            count += len(batch)
+        yield f'],"count":{count}}}'
+    
+    if mode == 'ndjson':
+        return Response(ndjson(), mimetype='application/x-ndjson')
+    return Response(json_array(), mimetype='application/json')
 
 @app.route('/api/users', methods=['GET'])
 def get_users():
-    """return all users"""
+    """return all users, or a page of them (limit, after: the next_cursor of the previous page);
+    stream=ndjson|json streams all of them instead"""
     try:
-        users = user_manager.get_all_users()
-        users_data = [user.to_dict() for user in users]
+        # a bad query is a 400 whatever If-None-Match says
+        fields = fields_arg()
+        limit = int_arg('limit')
+        after = request.args.get('after')
+        after_key = parse_cursor(after) if after else None
+        if limit is not None and limit < 1:
+            raise ValueError("Limit must be at least 1")
+        stream = stream_arg()
+        if stream and (limit is not None or after is not None):
+            raise ValueError('stream cannot be combined with limit or after')
+        
+        # the generation, then the tag, then the users: a change landing in between
+        # keeps the response out of the cache, so a cached tag is exactly its users'
+        # version, and a response's users are always at least as new as its tag
+        generation = response_cache.generation
+        tag = etag(user_manager.version)
+        cached = not_modified(tag)
+        if cached:
+            return cached
+        
+        if stream:
+            # read from storage a batch at a time, oldest first
+            return with_etag(stream_users(user_manager.iter_users(STREAM_BATCH), fields, stream), tag)
+        
+        key = ('users', request.query_string)
+        entry = response_cache.get(key)
+        if entry:
+            # a page outlives changes to other pages, so its tag may be older than the
+            # current one and still match the client's copy
+            return not_modified(entry[0]) or cached_response(entry)
+        
+        if limit is None and after is None:
+            users = user_manager.get_all_users()
+            
+            return cache_response(key, success_response(users_json(users, fields), count=len(users)),
+                                  tag, generation)
+        
+        # keyset pagination in creation order, next_cursor is None on the last page
+        limit = min(DEFAULT_PAGE_SIZE if limit is None else limit, MAX_PAGE_SIZE)
+        users, following = user_manager.page_with_next(limit, after)
+        next_cursor = page_cursor(users[-1]) if following else None
+        # the page only changes with the users past its cursor, up to the first
+        # user of the next page (which decides whether there is one)
+        span = (after_key, created_order(following) if following else None)
         
+        return cache_response(key, success_response(users_json(users, fields), count=len(users),
+                                                     next_cursor=next_cursor), tag, generation, span)
+    
+    except ValueError as e:
         return jsonify({
-            'status': 'success',
-            'data': users_data,
-            'count': len(users_data),
-            'timestamp': time.strftime('%Y-%m-%d %H:%M:%S')
-        }),200
-
+            'status': 'error',
+            'message': str(e),
+            'timestamp': timestamp()
+        }), 400
     except Exception as e:
         return jsonify({
             'status': 'error',
             'message': str(e),
-            'timestamp': time.strftime('%Y-%m-%d %H:%M:%S')
+            'timestamp': timestamp()
         }), 500
 
 @app.route('/api/users/<id>', methods=['GET'])
 def get_user(id):
     """return a specific user by ID"""
     try:
+        # a cached response is dropped when the user changes or is deleted
+        entry = response_cache.get(('user', id))
+        if entry:
+            return not_modified(entry[0]) or cached_response(entry)
+        
+        # in the same order as get_users: generation, tag, then the user
+        generation = response_cache.generation
+        tag = etag(user_manager.user_version(id))
         user = user_manager.get_user(id)
         if not user:
             return jsonify({
                 'status': 'error',
                 'message': f'User ID {id} does not exist',
-                'timestamp': time.strftime('%Y-%m-%d %H:%M:%S')
+                'timestamp': timestamp()
             }), 404
-            
-        return jsonify({
-            'status': 'success',
-            'data': user.to_dict(),
-            'timestamp': time.strftime('%Y-%m-%d %H:%M:%S')
-        }),200
+        
+        cached = not_modified(tag)
+        if cached:
+            return cached
+        
+        return cache_response(('user', id), success_response(user.to_json()), tag, generation)
     except Exception as e:
         return jsonify({
             'status': 'error',
             'message': str(e),
-            'timestamp': time.strftime('%Y-%m-%d %H:%M:%S')
+            'timestamp': timestamp()
         }), 500
 
 @app.route('/api/users', methods=['POST'])
@@ -61,7 +287,7 @@ def create_user():
             return jsonify({
                 'status': 'error',
                 'message': 'Request body must be JSON',
-                'timestamp': time.strftime('%Y-%m-%d %H:%M:%S')
+                'timestamp': timestamp()
             }), 400
         
         data = request.get_json()
@@ -72,30 +298,25 @@ def create_user():
             return jsonify({
                 'status': 'error',
                 'message': f'Missing required fields: {", ".join(missing_fields)}',
-                'timestamp': time.strftime('%Y-%m-%d %H:%M:%S')
+                'timestamp': timestamp()
             }), 400
         
         # Create user
         user = user_manager.create_user(data['name'], data['email'])
         
-        return jsonify({
-            'status': 'success',
-            'message': 'User created successfully',
-            'data': user.to_dict(),
-            'timestamp': time.strftime('%Y-%m-%d %H:%M:%S')
-        }), 201
+        return success_response(user.to_json(), 201, message='User created successfully')
         
     except ValueError as e:
         return jsonify({
             'status': 'error',
             'message': str(e),
-            'timestamp': time.strftime('%Y-%m-%d %H:%M:%S')
+            'timestamp': timestamp()
         }), 400
     except Exception as e:
         return jsonify({
             'status': 'error',
             'message': str(e),
-            'timestamp': time.strftime('%Y-%m-%d %H:%M:%S')
+            'timestamp': timestamp()
         }), 500
 
 @app.route('/api/users/<id>', methods=['PUT'])
@@ -106,7 +327,7 @@ def update_user(id):
             return jsonify({
                 'status': 'error',
                 'message': 'Request body must be JSON',
-                'timestamp': time.strftime('%Y-%m-%d %H:%M:%S')
+                'timestamp': timestamp()
             }), 400
         
         data = request.get_json()
@@ -116,30 +337,25 @@ def update_user(id):
             return jsonify({
                 'status': 'error',
                 'message': f'User ID {id} does not exist',
-                'timestamp': time.strftime('%Y-%m-%d %H:%M:%S')
+                'timestamp': timestamp()
             }), 404
         
         
         updated_user = user_manager.update_user(id, data.get('name'), data.get('email'))
         
-        return jsonify({
-            'status': 'success',
-            'message': 'User updated successfully',
-            'data': updated_user.to_dict(),
-            'timestamp': time.strftime('%Y-%m-%d %H:%M:%S')
-        }),200
+        return success_response(updated_user.to_json(), message='User updated successfully')
         
     except ValueError as e:
         return jsonify({
             'status': 'error',
             'message': str(e),
-            'timestamp': time.strftime('%Y-%m-%d %H:%M:%S')
+            'timestamp': timestamp()
         }), 400
     except Exception as e:
         return jsonify({
             'status': 'error',
             'message': str(e),
-            'timestamp': time.strftime('%Y-%m-%d %H:%M:%S')
+            'timestamp': timestamp()
         }), 500
 
 @app.route('/api/users/<id>', methods=['DELETE'])
@@ -152,7 +368,7 @@ def delete_user(id):
             return jsonify({
                 'status': 'error',
                 'message': f'User ID {id} does not exist',
-                'timestamp': time.strftime('%Y-%m-%d %H:%M:%S')
+                'timestamp': timestamp()
             }), 404
   
         user_manager.delete_user(id)
@@ -160,14 +376,14 @@ def delete_user(id):
         return jsonify({
             'status': 'success',
             'message': f'User {user.name} (ID: {id}) deleted successfully',
-            'timestamp': time.strftime('%Y-%m-%d %H:%M:%S')
+            'timestamp': timestamp()
         })
         
     except Exception as e:
         return jsonify({
             'status': 'error',
             'message': str(e),
-            'timestamp': time.strftime('%Y-%m-%d %H:%M:%S')
+            'timestamp': timestamp()
         }), 500
 
 @app.route('/api/users/search', methods=['GET'])
@@ -179,26 +395,93 @@ def search_users():
             return jsonify({
                 'status': 'error',
                 'message': 'Query parameter "q" is required',
-                'timestamp': time.strftime('%Y-%m-%d %H:%M:%S')
+                'timestamp': timestamp()
             }), 400
             
-        users = user_manager.search_users(query)
-        users_data = [user.to_dict() for user in users]
+        # prefix=true only matches names/emails that start with the query
+        prefix = request.args.get('prefix', '').lower() in ('1', 'true', 'yes')
+        stream = stream_arg()
+        if stream:
+            # matches are found a batch at a time while they are sent
+            users = user_manager.iter_search_users(query, prefix=prefix, batch_size=STREAM_BATCH)
+            return stream_users(users, None, stream, query=query, prefix=prefix)
+        
+        # kept until a user matching the query is created, changed or deleted
+        key = ('search', query, prefix)
+        entry = response_cache.get(key)
+        if entry:
+            return cached_response(entry)
+        generation = response_cache.generation
+        users = user_manager.search_users(query, prefix=prefix)
+        return cache_response(key, success_response(users_json(users), count=len(users), query=query,
+                                                    prefix=prefix), None, generation,
+                              terms=(search_term(query.lower().strip()),))
+    except ValueError as e:
+        return jsonify({
+            'status': 'error',
+            'message': str(e),
+            'timestamp': timestamp()
+        }), 400
+    except Exception as e:
+        return jsonify({
+            'status': 'error',
+            'message': str(e),
+            'timestamp': timestamp()
+        }), 500
 
+@app.route('/api/users/created', methods=['GET'])
+def get_users_created():
+    """users created in [since, until) (epoch seconds), oldest first; order=newest reverses"""
+    try:
+        since = int_arg('since')
+        until = int_arg('until')
+        limit = int_arg('limit')
+        newest_first = request.args.get('order', 'oldest').lower() == 'newest'
+        users = user_manager.get_users_created(since, until, limit, newest_first)
+        
+        return success_response(users_json(users), count=len(users), since=since, until=until)
+    except ValueError as e:
         return jsonify({
-            'status': 'success',
-            'data': users_data,
-            'count': len(users_data),
-            'query': query,
-            'timestamp': time.strftime('%Y-%m-%d %H:%M:%S')
-        })
+            'status': 'error',
+            'message': str(e),
+            'timestamp': timestamp()
+        }), 400
     except Exception as e:
         return jsonify({
             'status': 'error',
             'message': str(e),
-            'timestamp': time.strftime('%Y-%m-%d %H:%M:%S')
+            'timestamp': timestamp()
         }), 500
 
+@app.route('/api/users/newest', methods=['GET'])
+def get_newest_users():
+    """the most recently created users, newest first (limit, default 10)"""
+    try:
+        users = user_manager.get_newest_users(int_arg('limit', 10))
+        
+        return success_response(users_json(users), count=len(users))
+    except ValueError as e:
+        return jsonify({
+            'status': 'error',
+            'message': str(e),
+            'timestamp': timestamp()
+        }), 400
+    except Exception as e:
+        return jsonify({
+            'status': 'error',
+            'message': str(e),
+            'timestamp': timestamp()
+        }), 500
+
+@app.route('/api/cache', methods=['GET'])
+def get_cache_stats():
+    """hit/miss counts and size of the response cache"""
+    return jsonify({
+        'status': 'success',
+        'data': response_cache.stats(),
+        'timestamp': timestamp()
+    })
+
 @app.errorhandler(404)
 def not_found(error):
     """404 error handler"""
@@ -207,7 +490,7 @@ def not_found(error):
         'message': 'The requested resource does not exist',
         'path': request.path,
         'method': request.method,
-        'timestamp': time.strftime('%Y-%m-%d %H:%M:%S')
+        'timestamp': timestamp()
     }), 404
 
 @app.errorhandler(405)
@@ -217,7 +500,7 @@ def method_not_allowed(error):
         'status': 'error',
         'message': f'Method {request.method} is not allowed',
         'path': request.path,
-        'timestamp': time.strftime('%Y-%m-%d %H:%M:%S')
+        'timestamp': timestamp()
     }), 405
 
 @app.errorhandler(500)
@@ -226,23 +509,42 @@ def internal_error(error):
     return jsonify({
         'status': 'error',
         'message': 'Internal server error',
-        'timestamp': time.strftime('%Y-%m-%d %H:%M:%S')
+        'timestamp': timestamp()
     }), 500
 
 if __name__ == '__main__':
+    setup_logging()
+    # USER_STORAGE=sqlite keeps users in the SQLite database at USER_SQLITE_PATH;
+    # otherwise USER_DATA_DIR keeps them across restarts in a write-ahead log and
+    # snapshots there. USER_DATA_SYNC=0 acknowledges writes before they are fsynced
+    durable = os.environ.get('USER_DATA_SYNC', '1') != '0'
+    data_dir = os.environ.get('USER_DATA_DIR')
+    if os.environ.get('USER_STORAGE', 'memory') == 'sqlite':
+        use_manager(UserManager(SQLiteStorage(os.environ.get('USER_SQLITE_PATH', 'users.db'),
+                                              durable=durable)))
+        atexit.register(user_manager.close)
+    elif data_dir:
+        use_manager(UserManager(MemoryStorage(shards=int(os.environ.get('USER_SHARDS', 1)),
+                                              data_dir=data_dir, durable=durable)))
+        atexit.register(user_manager.close)
     print("Starting Flask REST API server...")
     print("API Endpoints:")
-    print("GET    /api/users               - Get all users")
+    print("GET    /api/users               - Get all users (limit/after for pages, fields=id,name to project, stream=ndjson|json)")
     print("GET    /api/users/<id>          - Get a specific user")
     print("POST   /api/users               - Create a new user")
     print("PUT    /api/users/<id>          - Update a user")
     print("DELETE /api/users/<id>          - Delete a user")
-    print("GET    /api/users/search?q=xxx  - Search users")
+    print("GET    /api/users/search?q=xxx  - Search users (&prefix=true for prefix matches, stream=ndjson|json)")
+    print("GET    /api/users/created       - Users created in a range (since, until: epoch seconds; limit; order=newest)")
+    print("GET    /api/users/newest        - Most recently created users (limit, default 10)")
+    print("GET    /api/cache               - Response cache hit/miss statistics")
     print("="*50)
 
-    # Seed some sample data
-    user_manager.create_user("Lucy", "lucy@example.com")
-    user_manager.create_user("David", "david@example.com")
-    user_manager.create_user("Kevin", "kevin@example.com")
+    # Seed some sample data (a recovered store already has it)
+    if not user_manager.get_all_users():
+        user_manager.create_user("Lucy", "lucy@example.com")
+        user_manager.create_user("David", "david@example.com")
+        user_manager.create_user("Kevin", "kevin@example.com")
 
-    app.run(host='0.0.0.0', port=5000, debug=True)
\ No newline at end of file
+    # the reloader would run a second process on the same data directory
+    app.run(host='0.0.0.0', port=5000, debug=True, use_reloader=not data_dir)
\ No newline at end of file
@@ -0,0 +1,559 @@
+# benchmark_models.py - in-process benchmarks for the UserManager data layer
+# Usage: python benchmark_models.py [benchmark ...]   (default: all)
+import json
+import random
+import shutil
+import sys
+import tempfile
+import threading
+import time
+import tracemalloc
+from models import ID_GENERATORS, MemoryStorage, User, UserManager, created_order, format_time, timestamp
+from sqlite_storage import SQLiteStorage
+
+
+def fill(manager, count, start=0):
+    """add users start..count-1 with unique names and emails"""
+    for i in range(start, count):
+        manager.create_user(f"User {i}", f"user{i}@example.com")
+
+
+def benchmark_create(sizes=(1_000, 10_000, 100_000, 1_000_000), samples=1_000):
+    """create_user latency (the POST /api/users path) as the user count grows"""
+    print(f"\n{'='*50}")
+    print("create_user latency vs. user count")
+    print('='*50)
+
+    manager = UserManager()
+    filled = 0
+    for size in sizes:
+        fill(manager, size, filled)
+        filled = size
+
+        start = time.perf_counter()
+        for i in range(samples):
+            manager.create_user(f"Sample {i}", f"sample{size}-{i}@example.com")
+        elapsed = time.perf_counter() - start
+        filled += samples
+
+        print(f"  {size:>9,} users: {elapsed / samples * 1e6:8.2f}us per create")
+
+
+def linear_search(manager, query):
+    """the search_users implementation before the trigram index, as a baseline"""
+    query = query.lower().strip()
+    return [user for user in manager.get_all_users()
+            if query in user.name.lower() or query in user.email.lower()]
+
+
+def benchmark_search(sizes=(10_000, 100_000, 1_000_000), queries=('user4242', '42@exam', 'nobody', 'us')):
+    """search_users with the trigram index vs. a linear scan"""
+    print(f"\n{'='*50}")
+    print("search_users: trigram index vs. linear scan")
+    print('='*50)
+
+    manager = UserManager()
+    filled = 0
+    for size in sizes:
+        fill(manager, size, filled)
+        filled = size
+
+        print(f"  {size:,} users")
+        for query in queries:
+            start = time.perf_counter()
+            indexed = manager.search_users(query)
+            index_time = time.perf_counter() - start
+
+            start = time.perf_counter()
+            scanned = linear_search(manager, query)
+            scan_time = time.perf_counter() - start
+
+            assert {u.id for u in indexed} == {u.id for u in scanned}
+            print(f"    {query!r:<12} {len(indexed):>9,} hits  index {index_time * 1000:9.3f}ms"
+                  f"  scan {scan_time * 1000:9.3f}ms")
+
+
+def benchmark_memory(count=200_000):
+    """memory per user: bare User objects, and a UserManager with all its indexes"""
+    print(f"\n{'='*50}")
+    print(f"Memory per user ({count:,} users)")
+    print('='*50)
+
+    tracemalloc.start()
+    users = [User(f"User {i}", f"user{i}@example.com") for i in range(count)]
+    print(f"  User objects:      {tracemalloc.get_traced_memory()[0] / count:6.0f} bytes/user")
+    del users
+    tracemalloc.stop()
+
+    tracemalloc.start()
+    manager = UserManager()
+    fill(manager, count)
+    print(f"  UserManager total: {tracemalloc.get_traced_memory()[0] / count:6.0f} bytes/user")
+    tracemalloc.stop()
+
+
+def benchmark_stress(threads=16, operations=5_000, emails=200, shard_counts=(1, 8)):
+    """many writer threads racing on a small email space; checks the invariants afterwards"""
+    print(f"\n{'='*50}")
+    print(f"Concurrent writers ({threads} threads x {operations:,} operations)")
+    print('='*50)
+
+    for shards in shard_counts:
+        stress(UserManager(MemoryStorage(shards)), threads, operations, emails)
+
+
+def stress(manager, threads, operations, emails):
+    created = []
+    errors = []
+    # switch threads far more often than the default 5ms to provoke races
+    switch_interval = sys.getswitchinterval()
+    sys.setswitchinterval(1e-6)
+
+    def writer(seed):
+        rng = random.Random(seed)
+        for _ in range(operations):
+            email = f"user{rng.randrange(emails)}@example.com"
+            action = rng.random()
+            try:
+                if action < 0.5:
+                    created.append(manager.create_user(f"Writer {seed}", email))
+                elif action < 0.7 and created:
+                    manager.update_user(rng.choice(created).id, name=f"Renamed {seed}", email=email)
+                elif action < 0.85 and created:
+                    manager.delete_user(rng.choice(created).id)
+                elif action < 0.95:
+                    manager.get_all_users()
+                else:
+                    manager.search_users(email[:8])
+            except ValueError:
+                # duplicate email or already deleted user: expected under contention
+                pass
+            except Exception as e:
+                errors.append(e)
+
+    start = time.perf_counter()
+    workers = [threading.Thread(target=writer, args=(seed,)) for seed in range(threads)]
+    for worker in workers:
+        worker.start()
+    for worker in workers:
+        worker.join()
+    elapsed = time.perf_counter() - start
+    sys.setswitchinterval(switch_interval)
+
+    users = manager.get_all_users()
+    user_emails = [user.email for user in users]
+    assert not errors, errors[:5]
+    assert len(user_emails) == len(set(user_emails)), "duplicate emails"
+    storage = manager.storage
+    assert storage.emails == {user.email: user.id for user in users}, "email index out of sync"
+    for user in users:
+        assert user.id in storage.shard_of(user.id).search_index.candidates(user.email.lower()), \
+            "search index out of sync"
+    print(f"  {len(storage.shards)} shard(s): {threads * operations:,} operations in {elapsed:.2f}s,"
+          f" {len(users)} users left, invariants hold")
+
+
+def benchmark_shards(shard_counts=(1, 4, 8), threads=8, operations=10_000):
+    """concurrent create/update/get throughput, and search latency, by shard count"""
+    print(f"\n{'='*50}")
+    print(f"Sharding ({threads} threads x {operations:,} create+update+get)")
+    print('='*50)
+
+    for shards in shard_counts:
+        manager = UserManager(MemoryStorage(shards))
+
+        def writer(seed):
+            for i in range(operations):
+                user = manager.create_user(f"User {seed}-{i}", f"user{seed}-{i}@example.com")
+                manager.update_user(user.id, name=f"Renamed {seed}-{i}")
+                manager.get_user(user.id)
+
+        start = time.perf_counter()
+        workers = [threading.Thread(target=writer, args=(seed,)) for seed in range(threads)]
+        for worker in workers:
+            worker.start()
+        for worker in workers:
+            worker.join()
+        elapsed = time.perf_counter() - start
+
+        start = time.perf_counter()
+        for _ in range(100):
+            manager.search_users('user3-4242')
+        search_time = (time.perf_counter() - start) / 100
+
+        print(f"  {shards} shard(s): {threads * operations * 3 / elapsed:9,.0f} ops/s"
+              f"  search {search_time * 1000:.3f}ms")
+
+
+def benchmark_persistence(threads=(1, 16), creates=20_000, recovery_users=1_000_000):
+    """create_user throughput with the write-ahead log, and recovery time"""
+    print(f"\n{'='*50}")
+    print("Persistence: write throughput and recovery")
+    print('='*50)
+
+    def run(manager, thread_count):
+        per_thread = creates // thread_count
+
+        def writer(seed):
+            for i in range(per_thread):
+                manager.create_user(f"User {seed}-{i}", f"user{seed}-{i}@example.com")
+
+        start = time.perf_counter()
+        workers = [threading.Thread(target=writer, args=(seed,)) for seed in range(thread_count)]
+        for worker in workers:
+            worker.start()
+        for worker in workers:
+            worker.join()
+        return per_thread * thread_count / (time.perf_counter() - start)
+
+    for thread_count in threads:
+        print(f"  {thread_count} writer thread(s)")
+        print(f"    in memory only:       {run(UserManager(), thread_count):9,.0f} creates/s")
+        for durable in (False, True):
+            data_dir = tempfile.mkdtemp()
+            manager = UserManager(MemoryStorage(data_dir=data_dir, durable=durable))
+            rate = run(manager, thread_count)
+            label = 'log, durable:' if durable else 'log, not waiting:'
+            print(f"    {label:<21} {rate:9,.0f} creates/s"
+                  f"  ({manager.storage.log.appended / max(manager.storage.log.syncs, 1):.1f} records per fsync)")
+            manager.close()
+            shutil.rmtree(data_dir)
+
+    data_dir = tempfile.mkdtemp()
+    manager = UserManager(MemoryStorage(data_dir=data_dir, durable=False, snapshot_every=float('inf')))
+    fill(manager, recovery_users)
+    manager.close()
+    start = time.perf_counter()
+    UserManager(MemoryStorage(data_dir=data_dir)).close()
+    print(f"  recover {recovery_users:,} users from the log:  {time.perf_counter() - start:6.2f}s")
+
+    manager = UserManager(MemoryStorage(data_dir=data_dir))
+    ids = [user.id for user in random.sample(manager.get_all_users(), 1_000)]
+    start = time.perf_counter()
+    for user_id in ids:
+        manager.get_user(user_id)
+    in_memory = (time.perf_counter() - start) / len(ids)
+    manager.storage.snapshot()
+    manager.close()
+
+    start = time.perf_counter()
+    manager = UserManager(MemoryStorage(data_dir=data_dir))
+    print(f"  recover {recovery_users:,} users from a snapshot: {time.perf_counter() - start:6.2f}s")
+    start = time.perf_counter()
+    for user_id in ids:
+        manager.get_user(user_id)
+    mapped = (time.perf_counter() - start) / len(ids)
+    print(f"  get_user: {in_memory * 1e6:.1f}us in memory, {mapped * 1e6:.1f}us from the mapped snapshot")
+    manager.close()
+    shutil.rmtree(data_dir)
+
+
+def benchmark_storage(count=100_000, samples=2_000):
+    """latency of each UserManager operation, in-memory vs. SQLite storage"""
+    print(f"\n{'='*50}")
+    print(f"Storage engines ({count:,} users, us per operation)")
+    print('='*50)
+
+    data_dir = tempfile.mkdtemp()
+    engines = {
+        'memory': MemoryStorage(),
+        'sqlite': SQLiteStorage(f'{data_dir}/users.db', durable=False),
+        'sqlite, fsync': SQLiteStorage(f'{data_dir}/users-durable.db'),
+    }
+    print(f"  {'':<14}{'create':>9}{'get':>9}{'update':>9}{'search':>9}{'delete':>9}{'all':>9}")
+    for label, storage in engines.items():
+        manager = UserManager(storage)
+        fill(manager, count)
+        ids = [user.id for user in random.sample(manager.get_all_users(), samples)]
+
+        def timed(operation):
+            start = time.perf_counter()
+            for i, user_id in enumerate(ids):
+                operation(i, user_id)
+            return (time.perf_counter() - start) / samples * 1e6
+
+        created = []
+        timings = [
+            timed(lambda i, _: created.append(manager.create_user(f"Sample {i}", f"sample{i}@example.com"))),
+            timed(lambda _, user_id: manager.get_user(user_id)),
+            timed(lambda i, user_id: manager.update_user(user_id, name=f"Renamed {i}")),
+            timed(lambda i, _: manager.search_users(f"user{i * 37 % count}@")),
+            timed(lambda i, _: manager.delete_user(created[i].id)),
+        ]
+        start = time.perf_counter()
+        manager.get_all_users()
+        timings.append((time.perf_counter() - start) * 1e6)
+        print(f"  {label:<14}" + ''.join(f"{timing:9.1f}" for timing in timings))
+        manager.close()
+    shutil.rmtree(data_dir)
+
+
+def benchmark_ids(count=200_000):
+    """cost of a new user's id and of formatting timestamps"""
+    print(f"\n{'='*50}")
+    print(f"Ids and timestamps (us per call, {count:,} calls)")
+    print('='*50)
+
+    def timed(function):
+        start = time.perf_counter()
+        for _ in range(count):
+            function()
+        return (time.perf_counter() - start) / count * 1e6
+
+    for name, new_id in ID_GENERATORS.items():
+        print(f"  id, {name + ':':<22}{timed(new_id):6.2f}")
+    now = int(time.time())
+    print(f"  strftime(localtime()):    {timed(lambda: time.strftime('%Y-%m-%d %H:%M:%S', time.localtime(now))):6.2f}")
+    print(f"  format_time (cached):     {timed(lambda: format_time(now)):6.2f}")
+    print(f"  timestamp():              {timed(timestamp):6.2f}")
+    for name, new_id in ID_GENERATORS.items():
+        User.new_id = staticmethod(new_id)
+        print(f"  User(), {name + ' ids:':<18}{timed(lambda: User('Name', 'name@example.com')):6.2f}")
+    User.new_id = staticmethod(ID_GENERATORS['ordered'])
+
+
+def benchmark_created(sizes=(10_000, 100_000, 1_000_000), recent=1_000):
+    """newest-N and created_at range queries through the index vs. sorting every user"""
+    print(f"\n{'='*50}")
+    print("created_at index: newest 10 and the last 1,000 users created, vs. sorting")
+    print('='*50)
+
+    # one user per second, so a time range selects a known number of users
+    clock = iter(range(10**9))
+    manager = UserManager()
+    filled = 0
+    for size in sizes:
+        for i in range(filled, size):
+            manager.storage.create(User(f"User {i}", f"user{i}@example.com", created=next(clock)))
+        filled = size
+        since = size - recent
+
+        start = time.perf_counter()
+        newest = manager.get_newest_users(10)
+        in_range = manager.get_users_created(since=since)
+        index_time = time.perf_counter() - start
+
+        start = time.perf_counter()
+        users = sorted(manager.get_all_users(), key=created_order)
+        sorted_newest = users[::-1][:10]
+        sorted_range = [user for user in users if user.created >= since]
+        sort_time = time.perf_counter() - start
+
+        assert newest == sorted_newest and in_range == sorted_range
+        print(f"  {size:>9,} users: index {index_time * 1000:8.3f}ms  sort {sort_time * 1000:9.3f}ms")
+
+
+def benchmark_pages(sizes=(10_000, 100_000, 1_000_000), page=100):
+    """one page of GET /api/users (keyset cursor, fields=id,name) vs. the full listing, serialized"""
+    print(f"\n{'='*50}")
+    print(f"GET /api/users: page of {page} vs. every user (data layer + JSON)")
+    print('='*50)
+
+    manager = UserManager()
+    filled = 0
+    for size in sizes:
+        fill(manager, size, filled)
+        filled = size
+
+        # 100 consecutive pages from halfway through, as a client paging through would fetch
+        _, cursor = manager.get_users_page(size // 2)
+        start = time.perf_counter()
+        for _ in range(100):
+            users, cursor = manager.get_users_page(page, cursor)
+            body = json.dumps([user.to_dict(('id', 'name')) for user in users])
+        page_time = (time.perf_counter() - start) / 100
+
+        start = time.perf_counter()
+        full = json.dumps([user.to_dict() for user in manager.get_all_users()])
+        full_time = time.perf_counter() - start
+
+        print(f"  {size:>9,} users: page {page_time * 1000:7.3f}ms {len(body):>7,} bytes"
+              f"  full {full_time * 1000:9.1f}ms {len(full):>11,} bytes")
+
+
+def benchmark_stream(sizes=(100_000, 1_000_000)):
+    """GET /api/users streamed (stream=ndjson|json) vs. buffered: time to first byte, total time, peak memory"""
+    import app  # Flask is only needed here
+    print(f"\n{'='*50}")
+    print("GET /api/users: streamed vs. buffered (Flask test client)")
+    print('='*50)
+
+    manager = UserManager()
+    app.use_manager(manager)
+    client = app.app.test_client()
+    filled = 0
+    for size in sizes:
+        fill(manager, size, filled)
+        filled = size
+        print(f"  {size:,} users:")
+        for query in ('', '?stream=ndjson', '?stream=json'):
+            start = time.perf_counter()
+            response = client.get(f'/api/users{query}', buffered=False)
+            chunks = iter(response.response)
+            body = len(next(chunks))
+            first = time.perf_counter() - start
+            body += sum(len(chunk) for chunk in chunks)
+            total = time.perf_counter() - start
+            response.close()
+
+            # a second pass under tracemalloc, which slows it down
+            tracemalloc.start()
+            response = client.get(f'/api/users{query}', buffered=False)
+            for _ in response.response:
+                pass
+            response.close()
+            peak = tracemalloc.get_traced_memory()[1]
+            tracemalloc.stop()
+
+            print(f"    {query or 'buffered':<15} first byte {first * 1000:9.3f}ms  total {total * 1000:8.1f}ms"
+                  f"  {body:>11,} bytes  peak {peak / 1e6:7.1f} MB")
+
+
+def benchmark_conditional(sizes=(1_000, 100_000), samples=200):
+    """GET /api/users and /api/users/<id>: a full 200 vs. a 304 for an unchanged ETag"""
+    import app  # Flask is only needed here
+    print(f"\n{'='*50}")
+    print("Conditional GET: 200 vs. 304 Not Modified (Flask test client)")
+    print('='*50)
+
+    manager = UserManager()
+    app.use_manager(manager)
+    client = app.app.test_client()
+    filled = 0
+    for size in sizes:
+        fill(manager, size, filled)
+        filled = size
+        user_id = manager.get_newest_users(1)[0].id
+        for endpoint in ('/api/users', f'/api/users/{user_id}'):
+            tag = client.get(endpoint).headers['ETag']
+            # the full listing is slow, fewer samples of it
+            runs = samples if endpoint != '/api/users' else max(10, samples * 1_000 // size)
+            timings = []
+            for headers in ({}, {'If-None-Match': tag}):
+                start = time.perf_counter()
+                for _ in range(runs):
+                    response = client.get(endpoint, headers=headers)
+                timings.append((time.perf_counter() - start) / runs)
+                timings.append(len(response.data))
+            label = '/api/users' if endpoint == '/api/users' else '/api/users/<id>'
+            print(f"  {size:>9,} users {label:<16} 200 {timings[0] * 1000:8.3f}ms {timings[1]:>11,} bytes"
+                  f"  304 {timings[2] * 1000:6.3f}ms {timings[3]} bytes")
+
+
+def benchmark_cache(size=100_000, samples=200):
+    """GET endpoints served from the response cache vs. encoded per request"""
+    import app  # Flask is only needed here
+    from response_cache import ResponseCache
+    print(f"\n{'='*50}")
+    print(f"Response cache: hits vs. no cache, {size:,} users (Flask test client)")
+    print('='*50)
+
+    manager = UserManager()
+    app.use_manager(manager)
+    fill(manager, size)
+    client = app.app.test_client()
+    user_id = manager.get_newest_users(1)[0].id
+    endpoints = [
+        ('/api/users', 5),
+        ('/api/users?limit=100', samples),
+        (f'/api/users/{user_id}', samples),
+        ('/api/users/search?q=user4242', samples),
+        ('/api/users/search?q=us', 5),
+    ]
+    for endpoint, runs in endpoints:
+        timings = []
+        for cache in (ResponseCache(0), ResponseCache(app.CACHE_BYTES)):
+            app.response_cache = cache
+            client.get(endpoint)
+            start = time.perf_counter()
+            for _ in range(runs):
+                client.get(endpoint)
+            timings.append((time.perf_counter() - start) / runs)
+        cached = 'hit' if cache.stats()['hits'] else 'not cached (over the size bound)'
+        print(f"  {endpoint:<32} uncached {timings[0] * 1000:8.3f}ms  cached {timings[1] * 1000:8.3f}ms"
+              f"  {timings[0] / timings[1]:6.1f}x  {cached}")
+
+
+def benchmark_json(size=100_000, samples=200):
+    """JSON encoding: users via to_dict + json module (Flask's default) vs. to_dict + orjson vs. User.to_json,
+    then each GET endpoint under the stdlib and orjson providers"""
+    import app  # Flask is only needed here
+    from flask.json.provider import DefaultJSONProvider
+    from json_provider import DEFAULT_JSON_PROVIDER, JSON_PROVIDERS, orjson
+    from response_cache import ResponseCache
+    print(f"\n{'='*50}")
+    print(f"JSON encoding, {size:,} users")
+    print('='*50)
+
+    manager = UserManager()
+    app.use_manager(manager)
+    fill(manager, size)
+    users = manager.get_all_users()
+
+    encoders = [('to_dict + json (Flask default)', lambda: json.dumps([user.to_dict() for user in users],
+                                                                      sort_keys=True).encode())]
+    if orjson is not None:
+        encoders.append(('to_dict + orjson', lambda: orjson.dumps([user.to_dict() for user in users])))
+    encoders.append(('to_json', lambda: ('[' + ','.join([user.to_json() for user in users]) + ']').encode()))
+    for label, encode in encoders:
+        start = time.perf_counter()
+        body = encode()
+        print(f"  {label:<32} {(time.perf_counter() - start) * 1000:8.1f}ms {len(body):>11,} bytes")
+
+    # per endpoint, response cache off; Flask's own provider only encodes the envelopes now
+    client = app.app.test_client()
+    app.response_cache = ResponseCache(0)
+    user_id = users[-1].id
+    endpoints = [
+        ('/api/users', 5),
+        ('/api/users?limit=100', samples),
+        (f'/api/users/{user_id}', samples),
+        ('/api/users/search?q=user4242', samples),
+        ('/api/users/newest?limit=100', samples),
+        ('/api/users?stream=json', 5),
+    ]
+    providers = [('default', DefaultJSONProvider)] + [(name, provider) for name, provider in JSON_PROVIDERS.items()
+                                                      if name != 'orjson' or orjson is not None]
+    print(f"\n  {'endpoint':<32}" + ''.join(f"{name:>12}" for name, _ in providers))
+    for endpoint, runs in endpoints:
+        timings = []
+        for _, provider in providers:
+            app.app.json = provider(app.app)
+            start = time.perf_counter()
+            for _ in range(runs):
+                client.get(endpoint).get_data()
+            timings.append((time.perf_counter() - start) / runs)
+        print(f"  {endpoint[:32]:<32}" + ''.join(f"{timing * 1000:10.3f}ms" for timing in timings))
+    app.app.json = JSON_PROVIDERS[DEFAULT_JSON_PROVIDER](app.app)
+
+
+BENCHMARKS = {
+    'create': benchmark_create,
+    'search': benchmark_search,
+    'memory': benchmark_memory,
+    'stress': benchmark_stress,
+    'shards': benchmark_shards,
+    'persistence': benchmark_persistence,
+    'storage': benchmark_storage,
+    'ids': benchmark_ids,
+    'created': benchmark_created,
+    'pages': benchmark_pages,
+    'stream': benchmark_stream,
+    'conditional': benchmark_conditional,
+    'cache': benchmark_cache,
+    'json': benchmark_json,
+}
+
+
+def main():
+    names = sys.argv[1:] or list(BENCHMARKS)
+    for name in names:
+        if name not in BENCHMARKS:
+            print(f"Unknown benchmark '{name}', expected one of: {', '.join(BENCHMARKS)}")
+            return
+    for name in names:
+        BENCHMARKS[name]()
+
+
+if __name__ == '__main__':
+    main()
@@ -55,8 +55,9 @@ class RestApiClient:
             print(f"[Error] Request exception: {e}")
             return {'status': 'error', 'message': str(e)}
     
-    def get_users(self):
-        return self._make_request('GET', '/api/users')
+    def get_users(self, limit: int = None, after: str = None, fields: str = None):
+        params = {'limit': limit, 'after': after, 'fields': fields}
+        return self._make_request('GET', '/api/users', params=params)
     
     def get_user(self, user_id) :
         return self._make_request('GET', f'/api/users/{user_id}')
@@ -83,6 +84,16 @@ class RestApiClient:
     def search_users(self, query: str) -> Dict[str, Any]:
         return self._make_request('GET', f'/api/users/search?q={query}')
     
+    def get_users_created(self, since: int = None, until: int = None, limit: int = None,
+                          newest_first: bool = False) -> Dict[str, Any]:
+        params = {'since': since, 'until': until, 'limit': limit}
+        if newest_first:
+            params['order'] = 'newest'
+        return self._make_request('GET', '/api/users/created', params=params)
+    
+    def get_newest_users(self, limit: int = 10) -> Dict[str, Any]:
+        return self._make_request('GET', '/api/users/newest', params={'limit': limit})
+    
     #########################################################
     # below is the test code
     def test_crud_create(self):
@@ -306,6 +317,228 @@ class RestApiClient:
             print(f"Format validation failed: {e}")
             return False
     
+    def test_created_range(self):
+        """Test created_at range and newest-first queries"""
+        print("\n[Test 7] Created range and newest users")
+        created_ids = []
+        try:
+            since = int(time.time())
+            for i in range(3):
+                response = requests.post(f'{self.base_url}/api/users',
+                                         json={'name': f'Range Test {i}', 'email': f'range{i}-{since}@test.com'})
+                created_ids.append(response.json()['data']['id'])
+            
+            response = requests.get(f'{self.base_url}/api/users/newest', params={'limit': 3})
+            newest = [user['id'] for user in response.json()['data']]
+            print(f"GET newest 3: {response.status_code} {newest}")
+            if newest != created_ids[::-1]:
+                print(f"Expected the users just created, newest first: {created_ids[::-1]}")
+                return False
+            
+            response = requests.get(f'{self.base_url}/api/users/created', params={'since': since})
+            in_range = [user['id'] for user in response.json()['data']]
+            print(f"GET created since {since}: {response.status_code} {len(in_range)} users")
+            if in_range[-3:] != created_ids:
+                print("Expected the users just created at the end, oldest first")
+                return False
+            
+            response = requests.get(f'{self.base_url}/api/users/created', params={'since': 'yesterday'})
+            print(f"GET created with a non-integer bound: {response.status_code}")
+            if response.status_code != 400:
+                print(f"Expected 400, got {response.status_code}")
+                return False
+            
+            print("Created range test passed")
+            return True
+        
+        except Exception as e:
+            print(f"Created range test failed: {e}")
+            return False
+        finally:
+            for user_id in created_ids:
+                requests.delete(f'{self.base_url}/api/users/{user_id}')
+    
+    def test_pagination(self):
+        """Test cursor pagination and field projection"""
+        print("\n[Test 8] Pagination and field projection")
+        created_ids = []
+        try:
+            suffix = int(time.time())
+            for i in range(5):
+                response = requests.post(f'{self.base_url}/api/users',
+                                         json={'name': f'Page Test {i}', 'email': f'page{i}-{suffix}@test.com'})
+                created_ids.append(response.json()['data']['id'])
+            
+            all_ids = [user['id'] for user in requests.get(f'{self.base_url}/api/users').json()['data']]
+            paged_ids = []
+            params = {'limit': 2, 'fields': 'id,name'}
+            while True:
+                result = requests.get(f'{self.base_url}/api/users', params=params).json()
+                if any(set(user) != {'id', 'name'} for user in result['data']):
+                    print(f"Projection returned other fields: {result['data']}")
+                    return False
+                paged_ids.extend(user['id'] for user in result['data'])
+                if not result['next_cursor']:
+                    break
+                params['after'] = result['next_cursor']
+            print(f"Paged through {len(paged_ids)} users, 2 at a time")
+            
+            if sorted(paged_ids) != sorted(all_ids) or paged_ids[-5:] != created_ids:
+                print("Pages do not cover every user exactly once in creation order")
+                return False
+            
+            # a field listed twice is written once, in the order first listed
+            response = requests.get(f'{self.base_url}/api/users', params={'limit': 1, 'fields': 'name,id,name'})
+            user = dict(json.loads(response.text, object_pairs_hook=list))['data'][0]
+            keys = [key for key, _ in user]
+            print(f"GET with a repeated field: {keys}")
+            if keys != ['name', 'id']:
+                print("Repeated field was not written once")
+                return False
+            
+            response = requests.get(f'{self.base_url}/api/users', params={'fields': 'id,password'})
+            print(f"GET with an unknown field: {response.status_code}")
+            if response.status_code != 400:
+                print(f"Expected 400, got {response.status_code}")
+                return False
+            
+            print("Pagination test passed")
+            return True
+        
+        except Exception as e:
+            print(f"Pagination test failed: {e}")
+            return False
+        finally:
+            for user_id in created_ids:
+                requests.delete(f'{self.base_url}/api/users/{user_id}')
+    
+    def test_streaming(self):
+        """Test streamed NDJSON and chunked JSON listings"""
+        print("\n[Test 9] Streaming responses")
+        created_ids = []
+        try:
+            suffix = int(time.time())
+            for i in range(3):
+                response = requests.post(f'{self.base_url}/api/users',
+                                         json={'name': f'Stream Test {i}', 'email': f'stream{i}-{suffix}@test.com'})
+                created_ids.append(response.json()['data']['id'])
+            
+            all_ids = [user['id'] for user in requests.get(f'{self.base_url}/api/users').json()['data']]
+            with requests.get(f'{self.base_url}/api/users', params={'stream': 'ndjson'}, stream=True) as response:
+                print(f"NDJSON stream: {response.status_code} {response.headers.get('Content-Type')}")
+                streamed_ids = [json.loads(line)['id'] for line in response.iter_lines() if line]
+            if sorted(streamed_ids) != sorted(all_ids) or streamed_ids[-3:] != created_ids:
+                print("NDJSON stream does not list every user once in creation order")
+                return False
+            
+            result = requests.get(f'{self.base_url}/api/users', params={'stream': 'json', 'fields': 'id'}).json()
+            print(f"JSON stream: {result['count']} users")
+            if result['status'] != 'success' or [user['id'] for user in result['data']] != streamed_ids:
+                print(f"JSON stream differs from the NDJSON one: {result}")
+                return False
+            
+            result = requests.get(f'{self.base_url}/api/users/search',
+                                  params={'q': 'stream', 'stream': 'json'}).json()
+            if not set(created_ids) <= {user['id'] for user in result['data']}:
+                print(f"Streamed search is missing the test users: {result}")
+                return False
+            
+            response = requests.get(f'{self.base_url}/api/users', params={'stream': 'xml'})
+            print(f"GET with an unknown stream format: {response.status_code}")
+            if response.status_code != 400:
+                print(f"Expected 400, got {response.status_code}")
+                return False
+            
+            print("Streaming test passed")
+            return True
+        
+        except Exception as e:
+            print(f"Streaming test failed: {e}")
+            return False
+        finally:
+            for user_id in created_ids:
+                requests.delete(f'{self.base_url}/api/users/{user_id}')
+    
+    def test_conditional_get(self):
+        """Test ETags and 304 Not Modified on repeated reads"""
+        print("\n[Test 10] Conditional GET")
+        user_id = None
+        try:
+            response = requests.post(f'{self.base_url}/api/users',
+                                     json={'name': 'ETag Test', 'email': f'etag-{int(time.time())}@test.com'})
+            user_id = response.json()['data']['id']
+            
+            response = requests.get(f'{self.base_url}/api/users')
+            tag = response.headers.get('ETag')
+            response = requests.get(f'{self.base_url}/api/users', headers={'If-None-Match': tag})
+            print(f"GET /api/users with If-None-Match {tag}: {response.status_code}, {len(response.content)} bytes")
+            if response.status_code != 304:
+                print(f"Expected 304, got {response.status_code}")
+                return False
+            
+            user_tag = requests.get(f'{self.base_url}/api/users/{user_id}').headers.get('ETag')
+            response = requests.get(f'{self.base_url}/api/users/{user_id}', headers={'If-None-Match': user_tag})
+            print(f"GET user with If-None-Match {user_tag}: {response.status_code}")
+            if response.status_code != 304:
+                print(f"Expected 304, got {response.status_code}")
+                return False
+            
+            requests.put(f'{self.base_url}/api/users/{user_id}', json={'name': 'ETag Test Updated'})
+            for endpoint, old_tag in ((f'/api/users/{user_id}', user_tag), ('/api/users', tag)):
+                response = requests.get(f'{self.base_url}{endpoint}', headers={'If-None-Match': old_tag})
+                print(f"GET {endpoint} after an update: {response.status_code} {response.headers.get('ETag')}")
+                if response.status_code != 200 or response.headers.get('ETag') == old_tag:
+                    print("Expected 200 with a new ETag")
+                    return False
+            
+            print("Conditional GET test passed")
+            return True
+        
+        except Exception as e:
+            print(f"Conditional GET test failed: {e}")
+            return False
+        finally:
+            if user_id:
+                requests.delete(f'{self.base_url}/api/users/{user_id}')
+    
+    def test_response_cache(self):
+        """Test that cached responses are served and dropped on writes"""
+        print("\n[Test 11] Response cache")
+        user_id = None
+        try:
+            response = requests.post(f'{self.base_url}/api/users',
+                                     json={'name': 'Cache Test', 'email': f'cache-{int(time.time())}@test.com'})
+            user_id = response.json()['data']['id']
+            
+            before = requests.get(f'{self.base_url}/api/cache').json()['data']
+            for _ in range(2):
+                requests.get(f'{self.base_url}/api/users/{user_id}')
+                requests.get(f'{self.base_url}/api/users/search', params={'q': 'cache test'})
+            after = requests.get(f'{self.base_url}/api/cache').json()['data']
+            print(f"Cache hits {before['hits']} -> {after['hits']}, entries: {after['entries']}")
+            if after['hits'] - before['hits'] < 2:
+                print("Repeated reads were not served from the cache")
+                return False
+            
+            requests.put(f'{self.base_url}/api/users/{user_id}', json={'name': 'Cache Test Updated'})
+            user = requests.get(f'{self.base_url}/api/users/{user_id}').json()['data']
+            found = requests.get(f'{self.base_url}/api/users/search', params={'q': 'cache test'}).json()['data']
+            found_name = {found_user['id']: found_user['name'] for found_user in found}.get(user_id)
+            print(f"After an update: {user['name']}, search finds {found_name}")
+            if user['name'] != 'Cache Test Updated' or found_name != 'Cache Test Updated':
+                print("A cached response outlived the update")
+                return False
+            
+            print("Response cache test passed")
+            return True
+        
+        except Exception as e:
+            print(f"Response cache test failed: {e}")
+            return False
+        finally:
+            if user_id:
+                requests.delete(f'{self.base_url}/api/users/{user_id}')
+    
     def run_all_tests(self):
         """Run all tests"""
         print("="*50)
@@ -322,6 +555,11 @@ class RestApiClient:
             ('CRUD - DELETE', self.test_crud_delete),
             ('HTTP Status Codes', self.test_http_status_codes),
             ('Request/Response Format', self.test_request_response_format),
+            ('Created Range', self.test_created_range),
+            ('Pagination', self.test_pagination),
+            ('Streaming', self.test_streaming),
+            ('Conditional GET', self.test_conditional_get),
+            ('Response Cache', self.test_response_cache),
         ]
         
         passed = 0
@@ -349,7 +587,8 @@ def interactive_mode():
     print("4. update <id> <name> <email> - Update user")
     print("5. delete <id> - Delete user")
     print("6. search <query> - Search users")
-    print("7. quit      - Exit")
+    print("7. newest [limit] - Most recently created users")
+    print("8. quit      - Exit")
     print("="*30)
     
     while True:
@@ -384,6 +623,8 @@ def interactive_mode():
             elif action == 'search' and len(command) > 1:
                 query = ' '.join(command[1:])
                 client.search_users(query)
+            elif action == 'newest':
+                client.get_newest_users(int(command[1]) if len(command) > 1 else 10)
             else:
                 print("Invalid command or insufficient parameters, please try again")
                 
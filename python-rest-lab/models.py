@@ -1,14 +1,95 @@
+import functools
+import heapq
+import logging
+import os
+import random
+import threading
 import time
 import uuid
+import zlib
+from itertools import islice
+from json.encoder import encode_basestring
+import persistence
+import snapshot
+from rwlock import ReadWriteLock
+from search_index import SubstringIndex
+from sorted_index import SortedKeys
+
+logger = logging.getLogger(__name__)
+
+MISSING = object()
+
+@functools.lru_cache(maxsize=4096)
+def format_time(seconds):
+    """epoch seconds as '%Y-%m-%d %H:%M:%S' (local time)
+    
+    Cached: users created in bulk share a handful of seconds, and every
+    response in the same second formats the same timestamp.
+    """
+    return time.strftime('%Y-%m-%d %H:%M:%S', time.localtime(seconds))
+
+def timestamp():
+    """the current time, formatted like format_time"""
+    return format_time(int(time.time()))
+
+class OrderedIds:
+    """time-ordered 64-bit ids (Snowflake style) as 16 hex digits
+    
+    The top 44 bits are Unix milliseconds and the low 20 a sequence, so ids
+    sort by creation time, as numbers and as strings. The sequence of each new
+    millisecond starts at a random point below 2^19: a restart whose clock
+    stepped back is unlikely to reissue an id. Generating one costs a clock
+    read and an f-string, a third of uuid4() (os.urandom plus UUID formatting).
+    """
+    
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.last = 0
+    
+    def __call__(self):
+        value = time.time_ns() // 1_000_000 << 20
+        with self.lock:
+            if value > self.last:
+                value |= random.getrandbits(19)
+            else:
+                # same millisecond (or the clock went back): continue the sequence,
+                # borrowing from the next millisecond if it overflows
+                value = self.last + 1
+            self.last = value
+        return f'{value:016x}'
+
+def random_id():
+    """a random (version 4) UUID, for when ids must not reveal creation order"""
+    return str(uuid.uuid4())
+
+ID_GENERATORS = {'ordered': OrderedIds(), 'uuid4': random_id}
 
 class User:
-    def __init__(self, name, email, user_id = None):
-        self.id = user_id or str(uuid.uuid4())
+    # no per-instance __dict__: saves over 100 bytes per user
+    __slots__ = ('id', 'name', 'email', 'created')
+    
+    # what to_dict() can be limited to
+    FIELDS = ('id', 'name', 'email', 'created_at')
+    
+    # makes the id of a new user, one of ID_GENERATORS (USER_IDS in app.py)
+    new_id = staticmethod(ID_GENERATORS['ordered'])
+    
+    def __init__(self, name, email, user_id = None, created = None):
+        self.id = user_id or User.new_id()
         self.name = name
         self.email = email
-        self.created_at = time.strftime('%Y-%m-%d %H:%M:%S')
+        # creation time as epoch seconds, a small int instead of a formatted string per user
+        self.created = int(time.time()) if created is None else created
     
-    def to_dict(self):
+    @property
+    def created_at(self):
+        """creation time formatted as '%Y-%m-%d %H:%M:%S' (local time)"""
+        return format_time(self.created)
+    
+    def to_dict(self, fields=None):
+        """the user as JSON data, only the given FIELDS if fields is set"""
+        if fields is not None:
+            return {field: getattr(self, field) for field in fields}
         return {
             'id': self.id,
             'name': self.name,
@@ -16,6 +97,18 @@ class User:
             'created_at': self.created_at
         }
     
+    def to_json(self, fields=None):
+        """to_dict(fields) encoded as compact JSON, without building the dict
+        
+        Names and emails are escaped by the json module's C string encoder; ids
+        and created_at never need escaping.
+        """
+        if fields is not None:
+            return '{' + ','.join([f'"{field}":{encode_basestring(getattr(self, field))}'
+                                   for field in fields]) + '}'
+        return '{"id":"%s","name":%s,"email":%s,"created_at":"%s"}' % (
+            self.id, encode_basestring(self.name), encode_basestring(self.email), self.created_at)
+    
     def update(self, name=None, email=None):
         """Update user information"""
         if name is not None:
@@ -26,11 +119,490 @@ class User:
     def __repr__(self):
         return f"User(id='{self.id}', name='{self.name}', email='{self.email}')"
 
+def matches(user, query, prefix=False):
+    """whether search_users(query, prefix) finds user (query lowercased and stripped)"""
+    if prefix:
+        return user.name.lower().startswith(query) or user.email.lower().startswith(query)
+    return query in user.name.lower() or query in user.email.lower()
+
+def created_order(user):
+    """sort key of the created_at index: creation time, ties broken by id"""
+    return user.created, user.id
+
+def page_cursor(user):
+    """opaque cursor for the page of users that follows user"""
+    return f'{user.created}:{user.id}'
+
+def parse_cursor(cursor):
+    """the created_order key a page_cursor() was made from, ValueError if it is not one"""
+    created, _, user_id = cursor.partition(':')
+    try:
+        if user_id:
+            return int(created), user_id
+    except ValueError:
+        pass
+    raise ValueError(f"Invalid cursor '{cursor}'")
+
+class UserShard:
+    """one partition of the users, with its own dict, search index and lock
+    
+    A shard recovered from a snapshot serves it straight from the mapped file
+    (base) and keeps only the users changed since in memory (users, indexed by
+    search_index and by_created); deleted holds the base users deleted since.
+    """
+    
+    def __init__(self, base=None):
+        self.base = base
+        self.users = {}
+        self.deleted = set()
+        # guards users, deleted and the indexes; get needs no lock (dict and set lookups)
+        self.lock = ReadWriteLock()
+        # trigram index over name and email for search_users
+        self.search_index = SubstringIndex()
+        # (created, id) of every user in users, for range and newest-first queries
+        self.by_created = SortedKeys()
+        # whether users, a dict and so in insertion order, is in created_order too:
+        # it is while every new user sorts after the others (time-ordered ids)
+        self.ordered = True
+    
+    def in_base(self, user_id):
+        """whether the snapshot holds user_id (changed since or not)"""
+        return self.base is not None and self.base.row_of(user_id) is not None
+    
+    def get(self, user_id):
+        user = self.users.get(user_id)
+        if user is None and self.base is not None and user_id not in self.deleted:
+            row = self.base.row_of(user_id)
+            if row is not None:
+                return next(self.base.users((row,), User, (), ()))
+        return user
+    
+    def all(self):
+        """every user in created_order, caller holds the read lock"""
+        users = self.users
+        if self.ordered:
+            overlay = list(users.values())
+        else:
+            overlay = [users[key[1]] for key in self.by_created]
+        if self.base is None:
+            return overlay
+        base = self.base.users(self.base.created_rows(), User, users, self.deleted)
+        # both are in created_order already, so sorting them only merges the two runs
+        return sorted(overlay + list(base), key=created_order)
+    
+    def search_candidates(self, query):
+        """users that may match the lowercased query in created_order, caller holds the read lock"""
+        candidates = self.search_index.candidates(query)
+        rows = None if self.base is None else self.base.candidate_rows(query)
+        if candidates is None or (self.base is not None and rows is None):
+            # too short for the index: every user is a candidate
+            return self.all()
+        
+        # index order is insertion order, which updates and recovery reshuffle
+        users = [self.users[user_id] for user_id in candidates]
+        if self.base is None:
+            return sorted(users, key=created_order)
+        users.extend(self.base.users(rows, User, self.users, self.deleted))
+        return sorted(users, key=created_order)
+    
+    def created_range(self, start=None, end=None, newest_first=False, after=None):
+        """users with start <= created < end in created_order, past the key after if given;
+        caller holds the read lock"""
+        low = None if start is None else (start,)
+        high = None if end is None else (end,)
+        if after is not None:
+            if newest_first:
+                high = after if high is None else min(high, after)
+            else:
+                low = after if low is None else max(low, after)
+        users = self.users
+        overlay = (users[key[1]] for key in self.by_created.irange(low, high, newest_first) if key != after)
+        if self.base is None:
+            return overlay
+        rows = self.base.created_rows(start, end, newest_first, after)
+        base = self.base.users(rows, User, users, self.deleted)
+        return heapq.merge(overlay, base, key=created_order, reverse=newest_first)
+    
+    def put(self, user):
+        """store a new or updated user, returns the in-memory user it replaced (if any); caller holds the write lock"""
+        old = self.users.get(user.id)
+        self.users[user.id] = user
+        self.deleted.discard(user.id)
+        if old is None:
+            self.search_index.add(user.id, user.name, user.email)
+            if self.by_created and (user.created, user.id) < self.by_created.maxes[-1]:
+                self.ordered = False
+            self.by_created.add((user.created, user.id))
+        elif (user.name, user.email) != (old.name, old.email):
+            self.search_index.update(user.id, user.name, user.email)
+        if old is not None and old.created != user.created:
+            self.by_created.remove((old.created, old.id))
+            self.by_created.add((user.created, user.id))
+            self.ordered = False
+        return old
+    
+    def remove(self, user_id):
+        """drop a user, returns it (None if absent); caller holds the write lock"""
+        user = self.get(user_id)
+        if user is None:
+            return None
+        if self.in_base(user_id):
+            self.deleted.add(user_id)
+        removed = self.users.pop(user_id, None)
+        if removed is not None:
+            self.search_index.remove(user_id)
+            self.by_created.remove((removed.created, user_id))
+        return user
+
+class Storage:
+    """where UserManager keeps its users
+    
+    UserManager validates and normalizes its input, then calls one of these.
+    Implementations must be safe to call from many request threads at once and
+    must keep emails unique, raising ValueError on conflicts and unknown ids.
+    """
+    
+    def create(self, user):
+        """store a new user, ValueError if its email is taken"""
+        raise NotImplementedError
+    
+    def get(self, user_id):
+        """the user with this id, None if there is none"""
+        raise NotImplementedError
+    
+    def all(self):
+        """every user, oldest first"""
+        raise NotImplementedError
+    
+    def update(self, user_id, name=None, email=None):
+        """change the given fields, returns (old user, updated user)"""
+        raise NotImplementedError
+    
+    def delete(self, user_id):
+        """remove a user, returns it"""
+        raise NotImplementedError
+    
+    def search(self, query, prefix=False):
+        """users whose lowercased name or email contains (or starts with) the lowercased query"""
+        raise NotImplementedError
+    
+    def iter_search(self, query, prefix=False, batch_size=1000):
+        """search(query, prefix) lazily, reading batch_size users at a time
+        
+        For streaming: only one batch is held however many users match, and no
+        lock is held between batches. This default checks every user in
+        created_order; engines that can resume an indexed search override it.
+        """
+        after = None
+        while True:
+            users = self.created_range(limit=batch_size, after=after)
+            yield from (user for user in users if matches(user, query, prefix))
+            if len(users) < batch_size:
+                return
+            after = created_order(users[-1])
+    
+    def created_range(self, start=None, end=None, limit=None, newest_first=False, after=None):
+        """at most limit users with start <= created < end (epoch seconds, None for no bound)
+        in created_order, newest first if asked; O(log n + limit), not a sort of every user
+        
+        after is the (created, id) of a user, for keyset pagination: only users
+        past it in that order are returned, whether or not it still exists.
+        """
+        raise NotImplementedError
+    
+    def close(self):
+        pass
+
+class MemoryStorage(Storage):
+    """in-memory user store, the default storage engine
+    
+    Users are hash-partitioned by id into independent shards, so writes to
+    different shards never wait on each other. Email uniqueness spans all shards
+    and is kept in one global email index with its own lock (on top of the
+    snapshot's email table when recovered from one).
+    
+    Writes hold a shard's write lock for the whole check-then-modify sequence.
+    The only nesting is a shard lock followed by the email lock, never the other
+    way round. Users are never modified in place: update swaps in a new User,
+    so a reader that already holds a User never sees it half updated.
+    
+    With a data_dir every change is also appended to a write-ahead log there
+    before the call returns (durable=True waits until it is fsynced, batched
+    with concurrent writers), and a snapshot is written every snapshot_every
+    changes. A new MemoryStorage on the same data_dir maps the snapshot and
+    replays the log written since, so startup time depends on the changes since
+    the last snapshot rather than on the number of users. It keeps serving the
+    snapshot it started from; only users changed since are held in memory.
+    """
+    
+    def __init__(self, shards=1, data_dir=None, durable=True, snapshot_every=100_000):
+        if shards < 1:
+            raise ValueError("MemoryStorage needs at least one shard")
+        self.shards = [UserShard() for _ in range(shards)]
+        # email -> user id across all shards, so duplicate checks are O(1); None marks
+        # an email that is free again although the snapshot still has it
+        self.emails = {}
+        self.emails_lock = threading.Lock()
+        
+        self.data_dir = data_dir
+        self.durable = durable
+        self.snapshot_every = snapshot_every
+        self.log = None
+        # held by the snapshot in progress, there is never more than one
+        self.snapshot_lock = threading.Lock()
+        if data_dir:
+            self.recover()
+    
+    def shard_of(self, user_id):
+        """the shard that owns user_id (crc32, stable across processes unlike hash())"""
+        return self.shards[zlib.crc32(user_id.encode()) % len(self.shards)]
+    
+    def email_owner(self, email):
+        """id of the user with this email, None if it is free; caller holds emails_lock"""
+        owner = self.emails.get(email, MISSING)
+        if owner is not MISSING:
+            return owner
+        for shard in self.shards:
+            if shard.base is not None:
+                row = shard.base.row_of_email(email)
+                if row is not None:
+                    return shard.base.user_id(row)
+        return None
+    
+    def release_email(self, email):
+        """mark an email free again; caller holds emails_lock"""
+        if any(shard.base is not None for shard in self.shards):
+            self.emails[email] = None
+        else:
+            del self.emails[email]
+        
+    def create(self, user):
+        # Check if email already exists, and reserve it for the new user
+        with self.emails_lock:
+            if self.email_owner(user.email) is not None:
+                raise ValueError(f"Email {user.email} is already used by another user")
+            self.emails[user.email] = user.id
+        
+        # Store the user
+        shard = self.shard_of(user.id)
+        with shard.lock.write():
+            shard.put(user)
+            seq = self.log_change(user)
+        self.commit(seq)
+    
+    def get(self, user_id):
+        return self.shard_of(user_id).get(user_id)
+    
+    def all(self):
+        # every shard's users in created_order, then merged
+        runs = []
+        for shard in self.shards:
+            with shard.lock.read():
+                runs.append(shard.all())
+        if len(runs) == 1:
+            return runs[0]
+        return list(heapq.merge(*runs, key=created_order))
+    
+    def update(self, user_id, name=None, email=None):
+        shard = self.shard_of(user_id)
+        with shard.lock.write():
+            user = shard.get(user_id)
+            if not user:
+                raise ValueError(f"User ID {user_id} does not exist")
+            
+            # Update user information on a copy, then swap it in
+            updated = User(user.name, user.email, user.id, user.created)
+            updated.update(name, email)
+            if updated.email != user.email:
+                # Ensure the email is not used by another user
+                with self.emails_lock:
+                    if self.email_owner(updated.email) is not None:
+                        raise ValueError(f"Email {email} is already used by another user")
+                    self.release_email(user.email)
+                    self.emails[updated.email] = user_id
+            shard.put(updated)
+            seq = self.log_change(updated)
+        self.commit(seq)
+        return user, updated
+    
+    def delete(self, user_id):
+        shard = self.shard_of(user_id)
+        with shard.lock.write():
+            user = shard.remove(user_id)
+            if user is None:
+                raise ValueError(f"User ID {user_id} does not exist")
+            
+            with self.emails_lock:
+                self.release_email(user.email)
+            seq = self.log_change(user, deleted=True)
+        self.commit(seq)
+        return user
+    
+    def search(self, query, prefix=False):
+        # each shard's index narrows its users down to candidates, each one is still
+        # checked (queries too short for the index check every user). The shards are
+        # visited one after another: under the GIL a thread per shard only adds overhead.
+        # Each shard's matches are in created_order, and merged
+        runs = []
+        for shard in self.shards:
+            with shard.lock.read():
+                candidates = shard.search_candidates(query)
+            runs.append([user for user in candidates if matches(user, query, prefix)])
+        if len(runs) == 1:
+            return runs[0]
+        return list(heapq.merge(*runs, key=created_order))
+    
+    def iter_search(self, query, prefix=False, batch_size=1000):
+        # every shard walked in created_order a batch at a time under its read lock,
+        # released before the batch's matches are yielded; merged like search()
+        def shard_matches(shard):
+            after = None
+            while True:
+                with shard.lock.read():
+                    users = list(islice(shard.created_range(after=after), batch_size))
+                yield from (user for user in users if matches(user, query, prefix))
+                if len(users) < batch_size:
+                    return
+                after = created_order(users[-1])
+        
+        return heapq.merge(*(shard_matches(shard) for shard in self.shards), key=created_order)
+    
+    def created_range(self, start=None, end=None, limit=None, newest_first=False, after=None):
+        # the first limit users of every shard, then merged: no shard can contribute more
+        ranges = []
+        for shard in self.shards:
+            with shard.lock.read():
+                ranges.append(list(islice(shard.created_range(start, end, newest_first, after), limit)))
+        return list(islice(heapq.merge(*ranges, key=created_order, reverse=newest_first), limit))
+    
+    def log_change(self, user, deleted=False):
+        """append a change to the write-ahead log, returns its sequence number (None without a log)
+        
+        Called under the shard's write lock, so the log order of one user's changes
+        is the order they were applied in.
+        """
+        if self.log is None:
+            return None
+        if deleted:
+            return self.log.append(('delete', user.id))
+        return self.log.append(('put', user.id, user.name, user.email, user.created))
+    
+    def commit(self, seq):
+        """wait for a logged change to be durable, and start a snapshot when one is due"""
+        if seq is None:
+            return
+        if self.durable:
+            self.log.wait(seq)
+        if seq - self.log.rotated_at >= self.snapshot_every and self.snapshot_lock.acquire(blocking=False):
+            threading.Thread(target=self.snapshot_in_background, name='snapshot', daemon=True).start()
+    
+    def apply(self, record):
+        """replay one write-ahead log record"""
+        shard = self.shard_of(record[1])
+        if record[0] == 'put':
+            shard.put(User(record[2], record[3], record[1], record[4]))
+        else:
+            shard.remove(record[1])
+    
+    def recover(self):
+        """map the snapshot and replay the log in data_dir, then start a new log segment"""
+        start = time.perf_counter()
+        os.makedirs(self.data_dir, exist_ok=True)
+        
+        mapped = snapshot.read_snapshot(self.data_dir)
+        first_segment = 0
+        if mapped:
+            first_segment, tables = mapped
+            if len(tables) == len(self.shards):
+                self.shards = [UserShard(table) for table in tables]
+            else:
+                # written with another shard count: load every user into its new shard
+                logger.warning("Snapshot in %s has %d shards, redistributing its users over %d",
+                               self.data_dir, len(tables), len(self.shards))
+                for table in tables:
+                    for user in table.users(table.live_rows(), User, (), ()):
+                        self.shard_of(user.id).put(user)
+        
+        replayed = 0
+        for record in persistence.read_log(self.data_dir, first_segment):
+            self.apply(record)
+            replayed += 1
+        
+        for shard in self.shards:
+            if shard.base is not None:
+                # the snapshot emails of users changed or deleted since are free,
+                # unless the loop below finds them taken again
+                for user_id in list(shard.users) + list(shard.deleted):
+                    row = shard.base.row_of(user_id)
+                    if row is not None:
+                        self.emails[shard.base.field(row, 2).decode()] = None
+        for shard in self.shards:
+            for user in shard.users.values():
+                self.emails[user.email] = user.id
+        
+        # always start a fresh segment: the last one may end in a torn record
+        segments = persistence.list_segments(self.data_dir)
+        self.log = persistence.WriteAheadLog(self.data_dir, max(segments[-1] + 1 if segments else 0, first_segment))
+        persistence.remove_segments(self.data_dir, below=first_segment)
+        logger.info("Recovered %s in %.3fs: %d users mapped from the snapshot, %d log records replayed",
+                    self.data_dir, time.perf_counter() - start,
+                    sum(shard.base.live for shard in self.shards if shard.base is not None), replayed)
+    
+    def snapshot(self):
+        """write a snapshot of all users and drop the log segments it covers"""
+        with self.snapshot_lock:
+            self.write_snapshot()
+    
+    def snapshot_in_background(self):
+        try:
+            self.write_snapshot()
+        except Exception:
+            logger.exception("Snapshot of %s failed", self.data_dir)
+        finally:
+            self.snapshot_lock.release()
+    
+    def write_snapshot(self):
+        # changes from here on go to the new segment, replayed on top of the snapshot;
+        # each shard is copied under its own read lock (Users are immutable, copying
+        # the dict is enough), and the file is built from the copies without locks
+        start = time.perf_counter()
+        segment = self.log.rotate()
+        images = []
+        for shard in self.shards:
+            with shard.lock.read():
+                state = (shard.base, dict(shard.users), set(shard.deleted), shard.search_index.dump())
+            images.append(snapshot.shard_image(*state))
+        snapshot.write_snapshot(self.data_dir, segment, images)
+        persistence.remove_segments(self.data_dir, below=segment)
+        logger.info("Snapshot of %d users written to %s in %.2fs",
+                    sum(len(image.created) - image.dead.count(1) for image in images), self.data_dir, time.perf_counter() - start)
+    
+    def close(self):
+        """flush and close the write-ahead log"""
+        if self.log is not None:
+            self.log.close()
+
 # User manager - simulate database operations
 class UserManager:
+    """validates user data and hands it to a storage engine (MemoryStorage by default)
     
-    def __init__(self):
-        self.users = {}
+    Every change bumps a version counter, for conditional GETs: version covers
+    all users, user_version(user_id) one of them. Versions start from 0 in each
+    process, so epoch (random per manager) tells them apart across restarts.
+    A version is bumped after its change is stored, so data read after reading
+    a version is at least that new. Then each listener is called with the
+    user before and after the change (None before a create, after a delete).
+    """
+    
+    def __init__(self, storage=None):
+        self.storage = storage if storage is not None else MemoryStorage()
+        self.epoch = os.urandom(4).hex()
+        self.version = 0
+        # the version of each user's last update; a user created in this process
+        # (ids are never reused) or not changed since it started is at version 0
+        self.user_versions = {}
+        self.version_lock = threading.Lock()
+        self.listeners = []
         
     def create_user(self, name, email):
         # Validate inputs   
@@ -41,32 +613,42 @@ class UserManager:
         if '@' not in email:
             raise ValueError("Invalid email format")
         
-        # Check if email already exists
-        for user in self.users.values():
-            if user.email == email.strip().lower():
-                raise ValueError(f"Email {email} is already used by another user")
-
-        # Create the user
         user = User(name.strip(), email.strip().lower())
-        self.users[user.id] = user
-        
-        print(f"Created user: {user}")
+        self.storage.create(user)
+        self.record_change(None, user)
+        logger.debug("Created user: %s", user)
         return user
     
     def get_user(self, user_id):
         """Get user by ID"""
-        return self.users.get(user_id)
+        return self.storage.get(user_id)
+    
+    def user_version(self, user_id):
+        """The version of a user's last change (0 if unchanged since the process started)"""
+        return self.user_versions.get(user_id, 0)
+    
+    def add_listener(self, listener):
+        """Call listener(old, new) after every change"""
+        self.listeners.append(listener)
+    
+    def record_change(self, old, new):
+        """Bump the versions for a stored change and tell the listeners; the lock
+        keeps versions increasing when writes to different shards finish at once"""
+        with self.version_lock:
+            self.version += 1
+            if new is None:
+                self.user_versions.pop(old.id, None)
+            elif old is not None:
+                self.user_versions[new.id] = self.version
+        for listener in self.listeners:
+            listener(old, new)
     
     def get_all_users(self):
         """Get all users"""
-        return list(self.users.values())
+        return self.storage.all()
     
     def update_user(self, user_id, name=None, email=None):
         """Update user information"""
-        user = self.users.get(user_id)
-        if not user:
-            raise ValueError(f"User ID {user_id} does not exist")
-        
         # Validate update payload
         if name:
             name = name.strip()
@@ -79,42 +661,89 @@ class UserManager:
                 raise ValueError("Email cannot be empty")
             if '@' not in email:
                 raise ValueError("Invalid email format")
-            
-            # Ensure the email is not used by another user
-            for uid, u in self.users.items():
-                if uid != user_id and u.email == email:
-                    raise ValueError(f"Email {email} is already used by another user")
         
-        # Update user information
-        old_info = f"{user.name} ({user.email})"
-        user.update(name, email)
-        new_info = f"{user.name} ({user.email})"
-        
-        print(f"Updated user {user_id}: {old_info} -> {new_info}")
-        return user
+        user, updated = self.storage.update(user_id, name, email)
+        self.record_change(user, updated)
+        logger.debug("Updated user %s: %s (%s) -> %s (%s)", user_id, user.name, user.email,
+                     updated.name, updated.email)
+        return updated
     
     def delete_user(self, user_id):
         """Delete user"""
-        user = self.users.get(user_id)
-        if user_id not in self.users:
-            raise ValueError(f"User ID {user_id} does not exist")
-        
-        user = self.users.pop(user_id)
-        print(f"Deleted user: {user}")
+        user = self.storage.delete(user_id)
+        self.record_change(user, None)
+        logger.debug("Deleted user: %s", user)
         return True
     
-    def search_users(self, query):
-        """Search users by name or email"""
+    def search_users(self, query, prefix=False):
+        """Search users by name or email (substring, or prefix match when prefix is set)"""
         query = query.lower().strip()
         if not query:
             return []
         
-        results = []
-        for user in self.users.values():
-            if (query in user.name.lower() or 
-                query in user.email.lower()):
-                results.append(user)
-        
-        print(f"Search '{query}' found {len(results)} users")
+        results = self.storage.search(query, prefix)
+        logger.debug("Search '%s' found %d users", query, len(results))
         return results
-    
\ No newline at end of file
+    
+    def iter_search_users(self, query, prefix=False, batch_size=1000):
+        """Users search_users would return, found batch_size users at a time
+        
+        For streaming, like iter_users: memory stays at one batch however many
+        users match. Users changed meanwhile may or may not be included.
+        """
+        query = query.lower().strip()
+        if not query:
+            return iter(())
+        return self.storage.iter_search(query, prefix, batch_size)
+    
+    def get_users_created(self, since=None, until=None, limit=None, newest_first=False):
+        """Users created at or after since and before until (epoch seconds), oldest first"""
+        if limit is not None and limit < 0:
+            raise ValueError("Limit cannot be negative")
+        if since is not None and until is not None and since > until:
+            raise ValueError("since cannot be after until")
+        return self.storage.created_range(since, until, limit, newest_first)
+    
+    def get_users_page(self, limit, after=None):
+        """Up to limit users in creation order, after the cursor of the previous page
+        
+        Returns the users and the cursor of the next page, None after the last
+        one. Pages stay consistent while users are created and deleted: the
+        cursor is a position in the order, not an offset.
+        """
+        users, following = self.page_with_next(limit, after)
+        return users, page_cursor(users[-1]) if following else None
+    
+    def page_with_next(self, limit, after=None):
+        """get_users_page's users, and the first user of the next page instead of
+        its cursor (None after the last page)"""
+        if limit < 1:
+            raise ValueError("Limit must be at least 1")
+        key = parse_cursor(after) if after else None
+        # one more than asked for tells whether there is a next page
+        users = self.storage.created_range(limit=limit + 1, after=key)
+        if len(users) > limit:
+            return users[:limit], users[limit]
+        return users, None
+    
+    def iter_users(self, batch_size=1000):
+        """Every user in creation order, fetched batch_size at a time
+        
+        For streaming: memory stays at one batch however many users there are,
+        and no lock is held between batches, so a slow consumer never blocks
+        writers. Users created or deleted meanwhile may or may not be included.
+        """
+        after = None
+        while True:
+            users = self.storage.created_range(limit=batch_size, after=after)
+            yield from users
+            if len(users) < batch_size:
+                return
+            after = created_order(users[-1])
+    
+    def get_newest_users(self, count):
+        """The count most recently created users, newest first"""
+        return self.get_users_created(limit=count, newest_first=True)
+    
+    def close(self):
+        self.storage.close()
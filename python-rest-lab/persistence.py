@@ -0,0 +1,169 @@
+import json
+import logging
+import os
+import threading
+
+logger = logging.getLogger(__name__)
+
+# On-disk layout of a UserManager data directory:
+#
+#   wal-00000007.log   write-ahead log segments, one JSON record per line:
+#                      ["put", id, name, email, created] or ["delete", id]
+#   snapshot           every user and search index as of the start of a segment
+#                      (see snapshot.py); recovery maps it and replays the segments
+#                      from that one on
+#
+# Records carry the user's whole state, so replaying one the snapshot already
+# reflects is harmless: a segment may overlap the snapshot taken at its start.
+
+
+def segment_path(directory, segment):
+    return os.path.join(directory, f'wal-{segment:08d}.log')
+
+
+def list_segments(directory):
+    """numbers of the log segments in directory, ascending"""
+    return sorted(int(name[4:-4]) for name in os.listdir(directory)
+                  if name.startswith('wal-') and name.endswith('.log'))
+
+
+def remove_segments(directory, below):
+    """delete the log segments a snapshot has made redundant"""
+    for segment in list_segments(directory):
+        if segment < below:
+            os.remove(segment_path(directory, segment))
+
+
+def fsync_directory(directory):
+    """make file creations and renames in directory durable"""
+    fd = os.open(directory, os.O_RDONLY)
+    try:
+        os.fsync(fd)
+    finally:
+        os.close(fd)
+
+
+def read_log(directory, first_segment=0):
+    """every record in the segments from first_segment on, oldest first
+
+    A record without its trailing newline was torn by a crash mid-write, it and
+    anything after it in that segment are skipped.
+    """
+    for segment in list_segments(directory):
+        if segment < first_segment:
+            continue
+        path = segment_path(directory, segment)
+        with open(path, 'rb') as f:
+            for line in f:
+                if not line.endswith(b'\n'):
+                    logger.warning("Ignoring torn record at the end of %s", path)
+                    break
+                yield json.loads(line)
+
+
+class WriteAheadLog:
+    """append-only log of user changes with group commit
+
+    append() only queues a record. A background thread writes everything queued
+    so far with one write() and one fsync(), so writers that arrive while a sync
+    is in progress share the next one. wait() blocks until a record is on disk.
+    """
+
+    def __init__(self, directory, segment):
+        self.directory = directory
+        self.segment = segment
+        self.file = open(segment_path(directory, segment), 'ab')
+        fsync_directory(directory)
+
+        self.lock = threading.Lock()
+        self.queued = threading.Condition(self.lock)
+        self.flushed = threading.Condition(self.lock)
+        self.pending = []
+        # sequence numbers of the last queued record, the last one on disk and
+        # the last one before the current segment
+        self.appended = 0
+        self.synced = 0
+        self.rotated_at = 0
+        # fsyncs so far, appended / syncs is the average group commit size
+        self.syncs = 0
+        self.error = None
+        self.closed = False
+        # held while writing to or replacing self.file (reentrant: rotate flushes)
+        self.io_lock = threading.RLock()
+
+        self.flusher = threading.Thread(target=self.flush_loop, name='wal-flusher', daemon=True)
+        self.flusher.start()
+
+    def append(self, record):
+        """queue a record, returns its sequence number for wait()"""
+        line = json.dumps(record, separators=(',', ':')).encode() + b'\n'
+        with self.lock:
+            if self.closed:
+                raise ValueError("Write-ahead log is closed")
+            self.pending.append(line)
+            self.appended += 1
+            self.queued.notify()
+            return self.appended
+
+    def wait(self, seq):
+        """block until record seq has been fsynced"""
+        with self.lock:
+            while self.synced < seq:
+                if self.error:
+                    raise self.error
+                self.flushed.wait()
+
+    def flush(self):
+        """write and fsync everything queued so far"""
+        with self.io_lock:
+            with self.lock:
+                batch, self.pending = self.pending, []
+                seq = self.appended
+            if batch:
+                self.file.write(b''.join(batch))
+                self.file.flush()
+                os.fsync(self.file.fileno())
+            with self.lock:
+                self.synced = seq
+                self.syncs += bool(batch)
+                self.flushed.notify_all()
+
+    def flush_loop(self):
+        while True:
+            with self.lock:
+                while not self.pending and not self.closed:
+                    self.queued.wait()
+                if not self.pending:
+                    return
+            try:
+                self.flush()
+            except OSError as e:
+                logger.error("Write-ahead log flush failed, no further writes are durable: %s", e)
+                with self.lock:
+                    self.error = e
+                    self.flushed.notify_all()
+                return
+
+    def rotate(self):
+        """flush, then continue in a new segment; returns the new segment number
+
+        Records appended once this returns are in the new segment or later.
+        """
+        with self.io_lock:
+            self.flush()
+            self.file.close()
+            self.segment += 1
+            self.file = open(segment_path(self.directory, self.segment), 'ab')
+            fsync_directory(self.directory)
+            with self.lock:
+                self.rotated_at = self.appended
+            return self.segment
+
+    def close(self):
+        """write out what is still queued and stop the flusher"""
+        with self.lock:
+            self.closed = True
+            self.queued.notify()
+        self.flusher.join()
+        self.file.close()
+
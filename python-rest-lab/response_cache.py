@@ -0,0 +1,116 @@
+import threading
+from collections import OrderedDict
+
+
+class ResponseCache:
+    """encoded responses by key, least recently used evicted past max_bytes
+
+    Keys are tuples starting with a kind ('user', 'users', 'search'), so all
+    the entries of a kind can be invalidated without scanning the others. An
+    entry can also be put with terms of the caller's choosing, so the entries
+    with any of some terms can be found without scanning the whole kind.
+
+    A value computed while a change was being made may predate it, and must
+    not be cached after that change's invalidation has run. So callers read
+    generation before reading the data, and put() drops the value if any
+    invalidation happened since.
+    """
+
+    def __init__(self, max_bytes=64 * 2**20):
+        self.max_bytes = max_bytes
+        # key -> (value, size, terms), least recently used first
+        self.entries = OrderedDict()
+        self.kinds = {}
+        self.terms = {}
+        self.size = 0
+        self.generation = 0
+        self.lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.invalidations = 0
+
+    def get(self, key):
+        """the value cached for key, None if there is none"""
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            self.entries.move_to_end(key)
+            self.hits += 1
+            return entry[0]
+
+    def put(self, key, value, size, generation, terms=()):
+        """cache value (size bytes) unless anything was invalidated after generation was read;
+        returns whether it was cached"""
+        with self.lock:
+            if generation != self.generation or size > self.max_bytes:
+                return False
+            self._pop(key)
+            self.entries[key] = (value, size, terms)
+            self.kinds.setdefault(key[0], set()).add(key)
+            for term in terms:
+                self.terms.setdefault(term, set()).add(key)
+            self.size += size
+            while self.size > self.max_bytes:
+                self._pop(next(iter(self.entries)))
+                self.evictions += 1
+            return True
+
+    def invalidate(self, key):
+        """drop the entry for key"""
+        with self.lock:
+            self.generation += 1
+            if self._pop(key):
+                self.invalidations += 1
+
+    def invalidate_kind(self, kind, where=None):
+        """drop the entries of a kind, only those where(key, value) accepts if given"""
+        with self.lock:
+            self.generation += 1
+            self._invalidate(list(self.kinds.get(kind, ())), where)
+    
+    def invalidate_terms(self, terms, where=None):
+        """drop the entries put with any of terms, only those where(key, value) accepts if given"""
+        with self.lock:
+            self.generation += 1
+            keys = set()
+            for term in terms:
+                keys.update(self.terms.get(term, ()))
+            self._invalidate(keys, where)
+
+    def stats(self):
+        with self.lock:
+            lookups = self.hits + self.misses
+            return {
+                'entries': len(self.entries),
+                'bytes': self.size,
+                'max_bytes': self.max_bytes,
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_rate': self.hits / lookups if lookups else 0.0,
+                'evictions': self.evictions,
+                'invalidations': self.invalidations,
+            }
+
+    def _invalidate(self, keys, where):
+        # caller holds the lock
+        for key in keys:
+            if where is None or where(key, self.entries[key][0]):
+                self._pop(key)
+                self.invalidations += 1
+    
+    def _pop(self, key):
+        # caller holds the lock
+        entry = self.entries.pop(key, None)
+        if entry is None:
+            return False
+        self.size -= entry[1]
+        self.kinds[key[0]].discard(key)
+        for term in entry[2]:
+            keys = self.terms[term]
+            keys.discard(key)
+            if not keys:
+                del self.terms[term]
+        return True
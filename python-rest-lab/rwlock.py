@@ -0,0 +1,62 @@
+import threading
+from contextlib import contextmanager
+
+
+class ReadWriteLock:
+    """any number of concurrent readers, or one writer
+
+    Writers are preferred: once a writer is waiting, new readers queue behind
+    it, so a steady stream of reads cannot starve writes. Not reentrant.
+    """
+
+    def __init__(self):
+        self._changed = threading.Condition(threading.Lock())
+        self._readers = 0
+        self._writer = False
+        self._writers_waiting = 0
+
+    def acquire_read(self):
+        with self._changed:
+            while self._writer or self._writers_waiting:
+                self._changed.wait()
+            self._readers += 1
+
+    def release_read(self):
+        with self._changed:
+            self._readers -= 1
+            if not self._readers:
+                self._changed.notify_all()
+
+    def acquire_write(self):
+        with self._changed:
+            self._writers_waiting += 1
+            try:
+                while self._writer or self._readers:
+                    self._changed.wait()
+            finally:
+                self._writers_waiting -= 1
+                if not self._writers_waiting:
+                    # readers held back for us may go again if this wait was interrupted
+                    self._changed.notify_all()
+            self._writer = True
+
+    def release_write(self):
+        with self._changed:
+            self._writer = False
+            self._changed.notify_all()
+
+    @contextmanager
+    def read(self):
+        self.acquire_read()
+        try:
+            yield
+        finally:
+            self.release_read()
+
+    @contextmanager
+    def write(self):
+        self.acquire_write()
+        try:
+            yield
+        finally:
+            self.release_write()
@@ -0,0 +1,134 @@
+from array import array
+from bisect import bisect_left
+
+# length of the n-grams the index is built from; shorter queries fall back to a scan
+NGRAM = 3
+
+# stop intersecting posting lists once this few candidates are left, checking
+# them directly is cheaper than walking another (possibly huge) posting list
+VERIFY_THRESHOLD = 64
+
+EMPTY = array('I')
+
+
+def ngrams(text):
+    """every NGRAM-character window of text"""
+    return {text[i:i + NGRAM] for i in range(len(text) - NGRAM + 1)}
+
+
+def contains(posting, doc):
+    """whether the sorted posting list holds doc"""
+    i = bisect_left(posting, doc)
+    return i < len(posting) and posting[i] == doc
+
+
+class SubstringIndex:
+    """trigram inverted index for case-insensitive substring and prefix search
+
+    Every indexed user gets a document number, and the posting list of a trigram
+    holds the ascending document numbers of all users whose lowercased name or
+    email contains it. Removing a user only marks its document dead; once dead
+    documents outnumber live ones the posting lists are compacted.
+    """
+
+    def __init__(self):
+        self.postings = {}
+        # document number -> user id, None once the document is dead
+        self.docs = []
+        # user id -> its current document number
+        self.doc_of = {}
+        self.dead = 0
+
+    def add(self, user_id, name, email):
+        """index a new user"""
+        doc = len(self.docs)
+        self.docs.append(user_id)
+        self.doc_of[user_id] = doc
+        for gram in ngrams(name.lower()) | ngrams(email.lower()):
+            posting = self.postings.get(gram)
+            if posting is None:
+                posting = self.postings[gram] = array('I')
+            posting.append(doc)
+
+    def update(self, user_id, name, email):
+        """re-index a user whose name or email changed"""
+        self.remove(user_id)
+        self.add(user_id, name, email)
+
+    def remove(self, user_id):
+        """drop a user from the index"""
+        doc = self.doc_of.pop(user_id)
+        self.docs[doc] = None
+        self.dead += 1
+        if self.dead > len(self.doc_of):
+            self.compact()
+
+    def candidate_docs(self, query):
+        """document numbers that may contain the lowercased query, ascending
+
+        The result is a superset: callers still check every candidate. Returns
+        None for queries shorter than NGRAM, which cannot use the index.
+        """
+        grams = ngrams(query)
+        if not grams:
+            return None
+
+        # rarest trigram first, it bounds the candidate set
+        postings = sorted((self.postings.get(gram, EMPTY) for gram in grams), key=len)
+        docs = postings[0]
+        for posting in postings[1:]:
+            if len(docs) <= VERIFY_THRESHOLD:
+                break
+            if len(docs) * 20 < len(posting):
+                # few candidates, long posting list: binary search it (both are sorted)
+                docs = [doc for doc in docs if contains(posting, doc)]
+            else:
+                docs = sorted(set(docs).intersection(posting))
+        return docs
+
+    def candidates(self, query):
+        """ids of the users that may contain the lowercased query, in index order (None if too short)"""
+        docs = self.candidate_docs(query)
+        if docs is None:
+            return None
+        ids = self.docs
+        return [ids[doc] for doc in docs if ids[doc] is not None]
+
+    def dump(self):
+        """a copy of the index as (docs, grams, lengths, postings)
+
+        postings is every posting list concatenated into one array, in the order
+        of grams, with lengths giving the size of each.
+        """
+        grams = list(self.postings)
+        postings = array('I')
+        for gram in grams:
+            postings.extend(self.postings[gram])
+        return list(self.docs), grams, [len(self.postings[gram]) for gram in grams], postings
+
+    @classmethod
+    def from_postings(cls, postings):
+        """a read-only index over prebuilt posting lists, for candidate_docs()"""
+        index = cls()
+        index.postings = postings
+        return index
+
+    def compact(self):
+        """renumber the live documents and drop dead entries from every posting list"""
+        renumber = {}
+        live = []
+        for doc, user_id in enumerate(self.docs):
+            if user_id is not None:
+                renumber[doc] = len(live)
+                live.append(user_id)
+
+        postings = {}
+        for gram, posting in self.postings.items():
+            kept = array('I', [renumber[doc] for doc in posting if doc in renumber])
+            if kept:
+                postings[gram] = kept
+
+        self.postings = postings
+        self.docs = live
+        self.doc_of = {user_id: doc for doc, user_id in enumerate(live)}
+        self.dead = 0
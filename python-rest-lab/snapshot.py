@@ -0,0 +1,359 @@
+import json
+import mmap
+import os
+import struct
+import zlib
+from array import array
+from persistence import fsync_directory
+from search_index import SubstringIndex
+from sorted_index import bisect_rows
+
+# Binary snapshot of a UserManager, read through mmap without loading it.
+#
+#   magic, header offset, header size          (TRAILER_OFFSET bytes)
+#   per shard, each section 8-byte aligned:
+#     offsets   uint64[3 * rows + 1]   heap offsets of each row's id, name and email
+#                                      (a row's three strings are contiguous)
+#     created   int64[rows]            creation time, epoch seconds
+#     dead      uint8[rows]            1 for rows deleted or superseded since written
+#     ids       uint32[2^k]            open-addressing hash table (crc32, linear probing)
+#                                      of row + 1 by id, 0 for an empty slot
+#     emails    uint32[2^k]            the same by email
+#     by_created uint32[live rows]     the live rows ordered by (created, id)
+#     lengths   uint32[grams]          size of each trigram's posting list
+#     postings  uint32[...]            all posting lists concatenated, as row numbers
+#     heap      bytes                  UTF-8 ids, names and emails
+#   header                             JSON: segment, and per shard the row counts,
+#                                      trigrams and section positions
+#
+# Rows are append-only between compactions: a new snapshot keeps the previous
+# one's rows, hash tables and posting lists byte for byte, flags the rows changed
+# since as dead and appends the changed users, so writing it is mostly copying.
+# Dead rows stay in the hash tables (lookups skip them) until the tables are
+# rebuilt, which happens when they would be over half full or on compaction.
+# by_created only holds the rows live when it was written; the changed rows are
+# merged in by binary search rather than sorting all rows again.
+SNAPSHOT = 'snapshot'
+MAGIC = b'USERSNP3'
+TRAILER = struct.Struct('<8sQQ')
+TRAILER_OFFSET = 32
+
+
+class SnapshotTable:
+    """one shard of a snapshot, decoded lazily from the mapped file"""
+
+    def __init__(self, mapped, header):
+        self.mapped = mapped
+        view = memoryview(mapped)
+        sections = header['sections']
+
+        def section(name, fmt):
+            start, size = sections[name]
+            return view[start:start + size].cast(fmt)
+
+        self.offsets = section('offsets', 'Q')
+        self.created = section('created', 'q')
+        self.dead = section('dead', 'B')
+        self.ids = section('ids', 'I')
+        self.emails = section('emails', 'I')
+        self.by_created = section('by_created', 'I')
+        self.heap_start = sections['heap'][0]
+        self.rows = header['rows']
+        self.live = header['live']
+
+        postings = section('postings', 'I')
+        index = {}
+        start = 0
+        for gram, length in zip(header['grams'], section('lengths', 'I')):
+            index[gram] = postings[start:start + length]
+            start += length
+        self.index = SubstringIndex.from_postings(index)
+
+    def field(self, row, column):
+        """raw UTF-8 bytes of a row's id (0), name (1) or email (2)"""
+        offsets = self.offsets
+        at = 3 * row + column
+        return self.mapped[self.heap_start + offsets[at]:self.heap_start + offsets[at + 1]]
+
+    def user_id(self, row):
+        return self.field(row, 0).decode()
+
+    def users(self, rows, user_class, changed, deleted):
+        """decode the users in rows, leaving out the ids in changed or deleted"""
+        mapped, offsets, created, start = self.mapped, self.offsets, self.created, self.heap_start
+        for row in rows:
+            at = 3 * row
+            user_id = mapped[start + offsets[at]:start + offsets[at + 1]].decode()
+            if user_id in changed or user_id in deleted:
+                continue
+            yield user_class(mapped[start + offsets[at + 1]:start + offsets[at + 2]].decode(),
+                             mapped[start + offsets[at + 2]:start + offsets[at + 3]].decode(),
+                             user_id, created[row])
+
+    def find(self, table, column, key):
+        return find(table, self.dead, self.field, column, key)
+
+    def row_of(self, user_id):
+        return self.find(self.ids, 0, user_id.encode())
+
+    def row_of_email(self, email):
+        return self.find(self.emails, 2, email.encode())
+
+    def live_rows(self):
+        dead = self.dead
+        return (row for row in range(self.rows) if not dead[row])
+
+    def created_key(self, row):
+        return self.created[row], self.field(row, 0)
+    
+    def created_rows(self, start=None, end=None, reverse=False, after=None):
+        """live rows with start <= created < end in (created, id) order, descending with reverse
+        
+        after is a (created, id) key: only the rows past it in that direction.
+        """
+        order, created, dead = self.by_created, self.created, self.dead
+        first = 0 if start is None else bisect_rows(order, created.__getitem__, start)
+        last = len(order) if end is None else bisect_rows(order, created.__getitem__, end)
+        if after is not None:
+            key = (after[0], after[1].encode())
+            at = bisect_rows(order, self.created_key, key)
+            if reverse:
+                last = min(last, at)
+            else:
+                if at < len(order) and self.created_key(order[at]) == key:
+                    at += 1
+                first = max(first, at)
+        rows = range(last - 1, first - 1, -1) if reverse else range(first, last)
+        return (order[i] for i in rows if not dead[order[i]])
+    
+    def candidate_rows(self, query):
+        """live rows that may contain the lowercased query, None if it is too short for the index"""
+        rows = self.index.candidate_docs(query)
+        if rows is None:
+            return None
+        dead = self.dead
+        return [row for row in rows if not dead[row]]
+
+
+def find(table, dead, field, column, key):
+    """the live row whose column equals key (bytes) in a hash table, None if there is none"""
+    mask = len(table) - 1
+    slot = zlib.crc32(key) & mask
+    while True:
+        row = table[slot] - 1
+        if row < 0:
+            return None
+        if not dead[row] and field(row, column) == key:
+            return row
+        slot = (slot + 1) & mask
+
+
+def insert(table, field, column, row):
+    mask = len(table) - 1
+    slot = zlib.crc32(field(row, column)) & mask
+    while table[slot]:
+        slot = (slot + 1) & mask
+    table[slot] = row + 1
+
+
+def read_snapshot(directory):
+    """(segment, [SnapshotTable per shard]) mapped from the snapshot, or None if there is none yet"""
+    path = os.path.join(directory, SNAPSHOT)
+    if not os.path.exists(path):
+        return None
+
+    with open(path, 'rb') as f:
+        mapped = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+    magic, header_offset, header_size = TRAILER.unpack_from(mapped)
+    if magic != MAGIC:
+        raise ValueError(f"{path} is not a snapshot in the current format")
+    header = json.loads(mapped[header_offset:header_offset + header_size])
+    return header['segment'], [SnapshotTable(mapped, shard) for shard in header['shards']]
+
+
+def copy(typecode, view):
+    """an array holding a mapped section's values"""
+    values = array(typecode)
+    values.frombytes(view.cast('B'))
+    return values
+
+
+class ShardImage:
+    """the rows, hash tables and posting lists of one shard, in snapshot layout"""
+
+    def __init__(self, base):
+        if base is None:
+            self.offsets = array('Q', [0])
+            self.created = array('q')
+            self.dead = bytearray()
+            self.heap = bytearray()
+            self.ids = self.emails = None
+            self.by_created = array('I')
+            self.postings = {}
+        else:
+            # the previous snapshot's rows, copied as they are
+            self.offsets = copy('Q', base.offsets)
+            self.created = copy('q', base.created)
+            self.dead = bytearray(base.dead)
+            self.heap = bytearray(base.mapped[base.heap_start:base.heap_start + base.offsets[-1]])
+            self.ids = copy('I', base.ids)
+            self.emails = copy('I', base.emails)
+            self.by_created = copy('I', base.by_created)
+            self.postings = {gram: copy('I', posting) for gram, posting in base.index.postings.items()}
+
+    def append(self, user):
+        """add a row for user, returns its row number; the hash tables are updated by index_rows()"""
+        row = len(self.created)
+        for text in (user.id, user.name, user.email):
+            self.heap += text.encode()
+            self.offsets.append(len(self.heap))
+        self.created.append(user.created)
+        self.dead.append(0)
+        return row
+
+    def field(self, row, column):
+        return self.heap[self.offsets[3 * row + column]:self.offsets[3 * row + column + 1]]
+
+    def row_of(self, user_id):
+        return find(self.ids, self.dead, self.field, 0, user_id.encode())
+
+    def created_key(self, row):
+        return self.created[row], self.field(row, 0)
+    
+    def order_rows(self, rows):
+        """drop the dead rows from by_created and merge in rows (new, live)"""
+        dead = self.dead
+        order = array('I', [row for row in self.by_created if not dead[row]])
+        merged = array('I')
+        done = 0
+        for row in sorted(rows, key=self.created_key):
+            at = bisect_rows(order, self.created_key, self.created_key(row))
+            merged.extend(order[done:at])
+            merged.append(row)
+            done = at
+        merged.extend(order[done:])
+        self.by_created = merged
+    
+    def index_rows(self, rows):
+        """add rows to the hash tables, rebuilding them if they would be over half full"""
+        if self.ids is not None and 2 * len(self.created) < len(self.ids):
+            tables = (self.ids, self.emails)
+        else:
+            size = 1 << (2 * len(self.created)).bit_length()
+            self.ids = array('I', [0]) * size
+            self.emails = array('I', [0]) * size
+            tables = (self.ids, self.emails)
+            rows = (row for row in range(len(self.created)) if not self.dead[row])
+        for row in rows:
+            insert(tables[0], self.field, 0, row)
+            insert(tables[1], self.field, 2, row)
+
+    def compact(self):
+        """drop the dead rows, renumbering every posting list"""
+        renumber = array('i', [-1]) * len(self.created)
+        offsets = array('Q', [0])
+        created = array('q')
+        heap = bytearray()
+        for row in range(len(self.created)):
+            if not self.dead[row]:
+                renumber[row] = len(created)
+                heap += self.heap[self.offsets[3 * row]:self.offsets[3 * row + 3]]
+                start = offsets[-1] - self.offsets[3 * row]
+                offsets.extend(start + self.offsets[3 * row + i] for i in (1, 2, 3))
+                created.append(self.created[row])
+
+        for gram, posting in list(self.postings.items()):
+            kept = array('I', [renumber[row] for row in posting if renumber[row] >= 0])
+            if kept:
+                self.postings[gram] = kept
+            else:
+                del self.postings[gram]
+        self.by_created = array('I', [renumber[row] for row in self.by_created])
+        self.offsets, self.created, self.heap = offsets, created, heap
+        self.dead = bytearray(len(created))
+        # the row numbers changed, index_rows() rebuilds the hash tables
+        self.ids = self.emails = None
+
+
+def shard_image(base, users, deleted, index):
+    """the next snapshot of a shard: base (a SnapshotTable or None) with the overlay applied
+
+    users and deleted are the users changed and the base ids deleted since base,
+    index is the overlay's SubstringIndex.dump().
+    """
+    image = ShardImage(base)
+    if base is not None:
+        for user_id in list(users) + list(deleted):
+            row = image.row_of(user_id)
+            if row is not None:
+                image.dead[row] = 1
+
+    # overlay users get rows in index document order, so their posting lists stay sorted
+    docs, grams, lengths, postings = index
+    row_of_doc = array('i', [-1]) * len(docs)
+    appended = []
+    for doc, user_id in enumerate(docs):
+        if user_id is not None:
+            row_of_doc[doc] = image.append(users[user_id])
+            appended.append(row_of_doc[doc])
+    start = 0
+    for gram, length in zip(grams, lengths):
+        rows = [row_of_doc[doc] for doc in postings[start:start + length] if row_of_doc[doc] >= 0]
+        start += length
+        if gram in image.postings:
+            image.postings[gram].extend(rows)
+        elif rows:
+            image.postings[gram] = array('I', rows)
+
+    image.order_rows(appended)
+    if 2 * image.dead.count(1) > len(image.created):
+        image.compact()
+    image.index_rows(appended)
+    return image
+
+
+def write_snapshot(directory, segment, images):
+    """atomically replace the snapshot with one built from a ShardImage per shard"""
+    path = os.path.join(directory, SNAPSHOT)
+    temporary = path + '.tmp'
+    header = {'segment': segment, 'shards': []}
+    with open(temporary, 'wb') as f:
+        f.write(bytes(TRAILER_OFFSET))
+
+        def section(data):
+            f.write(bytes(-f.tell() % 8))
+            start = f.tell()
+            f.write(data)
+            return [start, f.tell() - start]
+
+        for image in images:
+            grams = list(image.postings)
+            postings = array('I')
+            for gram in grams:
+                postings.extend(image.postings[gram])
+            header['shards'].append({
+                'rows': len(image.created),
+                'live': len(image.created) - image.dead.count(1),
+                'grams': grams,
+                'sections': {
+                    'offsets': section(image.offsets),
+                    'created': section(image.created),
+                    'dead': section(image.dead),
+                    'ids': section(image.ids),
+                    'emails': section(image.emails),
+                    'by_created': section(image.by_created),
+                    'lengths': section(array('I', [len(image.postings[gram]) for gram in grams])),
+                    'postings': section(postings),
+                    'heap': section(image.heap),
+                },
+            })
+
+        encoded = json.dumps(header, separators=(',', ':')).encode()
+        header_offset = f.tell()
+        f.write(encoded)
+        f.seek(0)
+        f.write(TRAILER.pack(MAGIC, header_offset, len(encoded)))
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(temporary, path)
+    fsync_directory(directory)
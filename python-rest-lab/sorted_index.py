@@ -0,0 +1,98 @@
+from bisect import bisect_left, insort
+
+# keys per bucket: a bucket is split once it holds twice this many, so an insert
+# or removal moves at most a few thousand pointers however many keys there are
+LOAD = 1000
+
+
+class SortedKeys:
+    """ordered set of comparable keys with O(log n + k) range scans
+
+    A B-tree of height two: the keys are split over a list of sorted buckets,
+    and maxes holds the largest key of each, so finding a key's bucket and its
+    position in it are both binary searches.
+    """
+
+    def __init__(self):
+        self.buckets = []
+        self.maxes = []
+        self.size = 0
+
+    def __len__(self):
+        return self.size
+
+    def add(self, key):
+        """insert key (not already present)"""
+        self.size += 1
+        if not self.buckets:
+            self.buckets.append([key])
+            self.maxes.append(key)
+            return
+        # keys past the current maximum go into the last bucket
+        at = min(bisect_left(self.maxes, key), len(self.buckets) - 1)
+        bucket = self.buckets[at]
+        insort(bucket, key)
+        self.maxes[at] = bucket[-1]
+        if len(bucket) > 2 * LOAD:
+            self.buckets.insert(at + 1, bucket[LOAD:])
+            del bucket[LOAD:]
+            self.maxes.insert(at, bucket[-1])
+
+    def remove(self, key):
+        """drop key, ValueError if it is absent"""
+        at = bisect_left(self.maxes, key)
+        if at < len(self.buckets):
+            bucket = self.buckets[at]
+            i = bisect_left(bucket, key)
+            if i < len(bucket) and bucket[i] == key:
+                del bucket[i]
+                self.size -= 1
+                if bucket:
+                    self.maxes[at] = bucket[-1]
+                else:
+                    del self.buckets[at]
+                    del self.maxes[at]
+                return
+        raise ValueError(f"{key!r} is not in the index")
+
+    def irange(self, low=None, high=None, reverse=False):
+        """keys with low <= key < high in order (descending with reverse), None for no bound"""
+        buckets, maxes = self.buckets, self.maxes
+        if not buckets:
+            return
+        first = 0 if low is None else bisect_left(maxes, low)
+        last = len(buckets) - 1 if high is None else min(bisect_left(maxes, high), len(buckets) - 1)
+        if first > last:
+            return
+        if reverse:
+            for at in range(last, first - 1, -1):
+                bucket = buckets[at]
+                end = len(bucket) if high is None else bisect_left(bucket, high)
+                start = 0 if low is None or at != first else bisect_left(bucket, low)
+                for i in range(end - 1, start - 1, -1):
+                    yield bucket[i]
+        else:
+            for at in range(first, last + 1):
+                bucket = buckets[at]
+                start = 0 if low is None or at != first else bisect_left(bucket, low)
+                end = len(bucket) if high is None else bisect_left(bucket, high)
+                yield from bucket[start:end]
+
+    def __iter__(self):
+        for bucket in self.buckets:
+            yield from bucket
+
+
+def bisect_rows(rows, key_of, key):
+    """bisect_left over rows (an array sorted by key_of(row)) for key
+
+    bisect's key= argument is Python 3.10+, and the REST image runs 3.9.
+    """
+    low, high = 0, len(rows)
+    while low < high:
+        middle = (low + high) // 2
+        if key_of(rows[middle]) < key:
+            low = middle + 1
+        else:
+            high = middle
+    return low
@@ -0,0 +1,248 @@
+import sqlite3
+import threading
+from contextlib import contextmanager
+from models import Storage, User
+
+# seq orders users by creation like the in-memory store does, and is the rowid
+# the trigram full-text index refers to; triggers keep that index in step. The
+# index holds lowercased names and emails (lower() is Python's str.lower on
+# every connection), so it can only be filled by the triggers and MIGRATE
+SCHEMA = '''
+CREATE TABLE IF NOT EXISTS users (
+    seq INTEGER PRIMARY KEY,
+    id TEXT NOT NULL UNIQUE,
+    name TEXT NOT NULL,
+    email TEXT NOT NULL UNIQUE,
+    created INTEGER NOT NULL
+);
+CREATE INDEX IF NOT EXISTS users_created ON users (created, id);
+CREATE VIRTUAL TABLE IF NOT EXISTS users_search USING fts5(
+    name, email, content='', tokenize='trigram'
+);
+CREATE TRIGGER IF NOT EXISTS users_search_insert AFTER INSERT ON users BEGIN
+    INSERT INTO users_search (rowid, name, email) VALUES (new.seq, lower(new.name), lower(new.email));
+END;
+CREATE TRIGGER IF NOT EXISTS users_search_delete AFTER DELETE ON users BEGIN
+    INSERT INTO users_search (users_search, rowid, name, email)
+        VALUES ('delete', old.seq, lower(old.name), lower(old.email));
+END;
+CREATE TRIGGER IF NOT EXISTS users_search_update AFTER UPDATE OF name, email ON users BEGIN
+    INSERT INTO users_search (users_search, rowid, name, email)
+        VALUES ('delete', old.seq, lower(old.name), lower(old.email));
+    INSERT INTO users_search (rowid, name, email) VALUES (new.seq, lower(new.name), lower(new.email));
+END;
+'''
+# PRAGMA user_version of the schema above. Older databases (an index of the
+# names as written, folded by SQLite's ASCII-only rules) get the index rebuilt
+SCHEMA_VERSION = 2
+MIGRATE = f'''
+DROP TRIGGER IF EXISTS users_search_insert;
+DROP TRIGGER IF EXISTS users_search_delete;
+DROP TRIGGER IF EXISTS users_search_update;
+DROP TABLE IF EXISTS users_search;
+{SCHEMA}
+INSERT INTO users_search (rowid, name, email) SELECT seq, lower(name), lower(email) FROM users;
+PRAGMA user_version = {SCHEMA_VERSION};
+'''
+
+# Every statement is a constant string, so each connection's statement cache
+# prepares it once and reuses it. Columns are in User() argument order.
+USER_COLUMNS = 'name, email, id, created'
+INSERT = 'INSERT INTO users (id, name, email, created) VALUES (?, ?, ?, ?)'
+SELECT = f'SELECT {USER_COLUMNS} FROM users WHERE id = ?'
+SELECT_ALL = f'SELECT {USER_COLUMNS} FROM users ORDER BY seq'
+UPDATE = (f'UPDATE users SET name = coalesce(?, name), email = coalesce(?, email) WHERE id = ?'
+          f' RETURNING {USER_COLUMNS}')
+DELETE = f'DELETE FROM users WHERE id = ? RETURNING {USER_COLUMNS}'
+# queries are lowercased like the columns they are compared with: lower() is
+# Python's, while SQLite's own lower() and LIKE only fold ASCII letters.
+# Queries of 3+ characters go through the trigram index (a quoted phrase
+# matches wherever it occurs within a column) and each candidate is checked,
+# shorter ones scan the table
+SUBSTRING = 'instr(lower({0}name), ?) OR instr(lower({0}email), ?)'
+PREFIX = 'instr(lower({0}name), ?) = 1 OR instr(lower({0}email), ?) = 1'
+SEARCH = (f'SELECT {", ".join("users." + column for column in USER_COLUMNS.split(", "))}'
+          ' FROM users_search JOIN users ON users.seq = users_search.rowid'
+          ' WHERE users_search MATCH ? AND ({}) ORDER BY users.seq')
+SEARCH_SUBSTRING = SEARCH.format(SUBSTRING.format('users.'))
+SEARCH_PREFIX = SEARCH.format(PREFIX.format('users.'))
+SCAN_SUBSTRING = f'SELECT {USER_COLUMNS} FROM users WHERE {SUBSTRING.format("")} ORDER BY seq'
+SCAN_PREFIX = f'SELECT {USER_COLUMNS} FROM users WHERE {PREFIX.format("")} ORDER BY seq'
+# iter_search runs the same queries a page at a time, resuming past the last
+# seq, which comes back as a last column
+SEARCH_PAGE = (f'SELECT {", ".join("users." + column for column in USER_COLUMNS.split(", "))}, users.seq'
+               ' FROM users_search JOIN users ON users.seq = users_search.rowid'
+               ' WHERE users_search MATCH ? AND ({}) AND users.seq > ? ORDER BY users.seq LIMIT ?')
+SEARCH_SUBSTRING_PAGE = SEARCH_PAGE.format(SUBSTRING.format('users.'))
+SEARCH_PREFIX_PAGE = SEARCH_PAGE.format(PREFIX.format('users.'))
+SCAN_PAGE = f'SELECT {USER_COLUMNS}, seq FROM users WHERE ({{}}) AND seq > ? ORDER BY seq LIMIT ?'
+SCAN_SUBSTRING_PAGE = SCAN_PAGE.format(SUBSTRING.format(''))
+SCAN_PREFIX_PAGE = SCAN_PAGE.format(PREFIX.format(''))
+# created_at range and newest-first queries walk the (created, id) index; the
+# row value comparison starts past a pagination key
+CREATED_RANGE = (f'SELECT {USER_COLUMNS} FROM users WHERE (created, id) > (?, ?)'
+                 ' AND created >= ? AND created < ? ORDER BY created, id LIMIT ?')
+CREATED_RANGE_NEWEST = (f'SELECT {USER_COLUMNS} FROM users WHERE (created, id) < (?, ?)'
+                        ' AND created >= ? AND created < ? ORDER BY created DESC, id DESC LIMIT ?')
+# bounds past every created time
+MIN_CREATED = -2**63
+MAX_CREATED = 2**63 - 1
+
+
+class ConnectionPool:
+    """Thread-safe pool of SQLite connections, each used by one thread at a time
+
+    The REST server runs every request on a new thread, so connections are
+    handed from thread to thread rather than tied to one.
+    """
+
+    def __init__(self, connect, max_size=8):
+        # connect() opens a new configured connection
+        self.connect = connect
+        # connections open at once (idle + in use), connection() waits for a free slot
+        self.max_size = max_size
+        self.idle = []
+        self.lock = threading.Lock()
+        self.slots = threading.BoundedSemaphore(max_size)
+
+    @contextmanager
+    def connection(self):
+        self.slots.acquire()
+        try:
+            with self.lock:
+                conn = self.idle.pop() if self.idle else None
+            if conn is None:
+                conn = self.connect()
+            try:
+                yield conn
+            finally:
+                with self.lock:
+                    self.idle.append(conn)
+        finally:
+            self.slots.release()
+
+    def close(self):
+        """Close every idle connection"""
+        with self.lock:
+            while self.idle:
+                self.idle.pop().close()
+
+
+class SQLiteStorage(Storage):
+    """users in an SQLite database, for data sets larger than memory
+
+    The database runs in WAL mode, so readers never wait for the writer; emails
+    are kept unique by a UNIQUE index and search_users uses an FTS5 trigram
+    index. Memory use is bounded by cache_size_kib per pooled connection.
+    durable=False lets a commit return before it is fsynced (synchronous=NORMAL,
+    the database stays consistent but the last commits can be lost on power loss).
+    """
+
+    def __init__(self, path, durable=True, pool_size=8, cache_size_kib=16_384):
+        self.path = path
+        self.synchronous = 'FULL' if durable else 'NORMAL'
+        self.cache_size_kib = cache_size_kib
+        self.pool = ConnectionPool(self.connect, pool_size)
+        with self.pool.connection() as conn:
+            conn.execute('PRAGMA journal_mode = WAL')
+            if conn.execute('PRAGMA user_version').fetchone()[0] < SCHEMA_VERSION:
+                conn.executescript(f'BEGIN IMMEDIATE; {MIGRATE} COMMIT;')
+
+    def connect(self):
+        # autocommit: every statement is its own transaction, triggers included;
+        # timeout is how long a writer waits for another one to finish
+        conn = sqlite3.connect(self.path, timeout=30, isolation_level=None, check_same_thread=False)
+        conn.execute(f'PRAGMA synchronous = {self.synchronous}')
+        conn.execute(f'PRAGMA cache_size = -{self.cache_size_kib}')
+        # the search index and queries compare text lowercased as MemoryStorage does
+        conn.create_function('lower', 1, str.lower, deterministic=True)
+        return conn
+
+    def create(self, user):
+        try:
+            with self.pool.connection() as conn:
+                conn.execute(INSERT, (user.id, user.name, user.email, user.created))
+        except sqlite3.IntegrityError:
+            raise ValueError(f"Email {user.email} is already used by another user")
+
+    def get(self, user_id):
+        with self.pool.connection() as conn:
+            row = conn.execute(SELECT, (user_id,)).fetchone()
+        return User(*row) if row else None
+
+    def all(self):
+        with self.pool.connection() as conn:
+            return [User(*row) for row in conn.execute(SELECT_ALL)]
+
+    def update(self, user_id, name=None, email=None):
+        with self.pool.connection() as conn:
+            # the old row is needed for the caller's log, read it in the same transaction
+            conn.execute('BEGIN IMMEDIATE')
+            try:
+                old = conn.execute(SELECT, (user_id,)).fetchone()
+                if old is None:
+                    raise ValueError(f"User ID {user_id} does not exist")
+                try:
+                    new = conn.execute(UPDATE, (name, email, user_id)).fetchone()
+                except sqlite3.IntegrityError:
+                    raise ValueError(f"Email {email} is already used by another user")
+                conn.execute('COMMIT')
+            except BaseException:
+                conn.execute('ROLLBACK')
+                raise
+        return User(*old), User(*new)
+
+    def delete(self, user_id):
+        with self.pool.connection() as conn:
+            row = conn.execute(DELETE, (user_id,)).fetchone()
+        if row is None:
+            raise ValueError(f"User ID {user_id} does not exist")
+        return User(*row)
+
+    @staticmethod
+    def search_statement(query, prefix, paged=False):
+        """the statement search() (or, paged, iter_search()) runs for query, and its parameters"""
+        if len(query) >= 3:
+            phrase = '"' + query.replace('"', '""') + '"'
+            if paged:
+                return (SEARCH_PREFIX_PAGE if prefix else SEARCH_SUBSTRING_PAGE), (phrase, query, query)
+            return (SEARCH_PREFIX if prefix else SEARCH_SUBSTRING), (phrase, query, query)
+        if paged:
+            return (SCAN_PREFIX_PAGE if prefix else SCAN_SUBSTRING_PAGE), (query, query)
+        return (SCAN_PREFIX if prefix else SCAN_SUBSTRING), (query, query)
+
+    def search(self, query, prefix=False):
+        statement, parameters = self.search_statement(query, prefix)
+        with self.pool.connection() as conn:
+            return [User(*row) for row in conn.execute(statement, parameters)]
+
+    def iter_search(self, query, prefix=False, batch_size=1000):
+        # a page per pooled connection, so no connection (or read transaction) is
+        # held while the caller consumes a page
+        statement, parameters = self.search_statement(query, prefix, paged=True)
+        seq = 0
+        while True:
+            with self.pool.connection() as conn:
+                rows = conn.execute(statement, parameters + (seq, batch_size)).fetchall()
+            yield from (User(*row[:4]) for row in rows)
+            if len(rows) < batch_size:
+                return
+            seq = rows[-1][4]
+
+    def created_range(self, start=None, end=None, limit=None, newest_first=False, after=None):
+        # the row value is the bound the index is searched from, so fold the range
+        # into it ((created, '') sorts before every id created that second)
+        if newest_first:
+            bound = (MAX_CREATED if end is None else end, '')
+            after = bound if after is None else min(tuple(after), bound)
+        else:
+            bound = (MIN_CREATED if start is None else start, '')
+            after = bound if after is None else max(tuple(after), bound)
+        parameters = (*after, MIN_CREATED if start is None else start, MAX_CREATED if end is None else end,
+                      -1 if limit is None else limit)
+        with self.pool.connection() as conn:
+            return [User(*row) for row in conn.execute(CREATED_RANGE_NEWEST if newest_first else CREATED_RANGE,
+                                                       parameters)]
+
+    def close(self):
+        self.pool.close()
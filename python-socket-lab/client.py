@@ -1,18 +1,111 @@
+import os
 import socket
+import threading
 import time
+from collections import deque
+from protocol import (FRAME_BATCH, FRAME_ERROR, FRAME_MESSAGE, ProtocolError, ServerError, pack_batch, pack_frame,
+                      parse_address, recv_frame, send_frame, unpack_batch)
+
+class ConnectionPool:
+    """Thread-safe pool of persistent connections, so callers skip connect/close per message"""
+    
+    def __init__(self, connect, max_size=8, max_idle=10.0):
+        # connect() opens a new connected socket
+        self.connect = connect
+        # connections open at once (idle + in use), acquire() waits for a free slot
+        self.max_size = max_size
+        # idle connections older than this are closed instead of reused; keep it
+        # below the server's idle timeout so the server never closes them first
+        self.max_idle = max_idle
+        self.idle = deque()
+        self.lock = threading.Lock()
+        self.slots = threading.BoundedSemaphore(max_size)
+    
+    def acquire(self, timeout=None):
+        """Return (sock, reused): a healthy idle connection, or a new one if there is none"""
+        if not self.slots.acquire(timeout=timeout):
+            raise TimeoutError(f"No free connection in the pool after {timeout}s")
+        try:
+            while True:
+                with self.lock:
+                    self._evict_expired()
+                    if not self.idle:
+                        break
+                    # most recently used first, so rarely needed connections age out
+                    sock, _ = self.idle.pop()
+                if self._is_healthy(sock):
+                    return sock, True
+                sock.close()
+            return self.connect(), False
+        except BaseException:
+            self.slots.release()
+            raise
+    
+    def release(self, sock, healthy=True):
+        """Give a connection back; unhealthy ones (failed mid-request) are closed"""
+        try:
+            if healthy:
+                with self.lock:
+                    self.idle.append((sock, time.monotonic()))
+            else:
+                sock.close()
+        finally:
+            self.slots.release()
+    
+    def close(self):
+        """Close every idle connection (connections in use are closed on release)"""
+        with self.lock:
+            while self.idle:
+                self.idle.popleft()[0].close()
+    
+    def _evict_expired(self):
+        # the deque is ordered by release time, so the oldest entries are on the left
+        deadline = time.monotonic() - self.max_idle
+        while self.idle and self.idle[0][1] < deadline:
+            self.idle.popleft()[0].close()
+    
+    @staticmethod
+    def _is_healthy(sock):
+        """An idle connection has nothing to read: EOF or stray bytes mean it is unusable"""
+        timeout = sock.gettimeout()
+        try:
+            sock.setblocking(False)
+            sock.recv(1, socket.MSG_PEEK)
+        except BlockingIOError:
+            return True
+        except OSError:
+            return False
+        finally:
+            sock.settimeout(timeout)
+        return False
+
 
 class SocketClient:
-    def __init__(self, host='localhost', port=8080):
+    def __init__(self, host='localhost', port=8080, pool_size=8, max_idle=10.0):
         self.host = host
         self.port = port
+        # host may also be 'unix:/path' to talk to a server on a Unix domain socket
+        self.family, self.address = parse_address(host, port)
         self.socket = None
+        # persistent connections for request()/request_batch(), opened on first use
+        self.pool = ConnectionPool(self.open_socket, pool_size, max_idle)
+    
+    def open_socket(self):
+        """Open a new connection to the server (TCP or Unix domain socket)"""
+        sock = socket.socket(self.family, socket.SOCK_STREAM)
+        try:
+            sock.connect(self.address)
+        except OSError:
+            sock.close()
+            raise
+        return sock
         
     def connect(self):
         """Connect to the server"""
         try:
-            self.socket = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
-            self.socket.connect((self.host, self.port))
-            print(f"Successfully connected to server {self.host}:{self.port}")
+            self.socket = self.open_socket()
+            target = self.host if self.family == socket.AF_UNIX else f"{self.host}:{self.port}"
+            print(f"Successfully connected to server {target}")
             return True
         except Exception as e:
             print(f"Failed to connect to server: {e}")
@@ -25,13 +118,12 @@ class SocketClient:
                 print("Not connected to the server")
                 return None
                 
-            # send the message
-            self.socket.sendall(message.encode('utf-8'))
+            # send the message as one frame
+            send_frame(self.socket, message.encode('utf-8'))
             print(f"Sent message: {message}")
             
-            # wait for and receive the response
-            response = self.socket.recv(1024)
-            response_text = response.decode('utf-8')
+            # wait for and receive the response frame
+            response_text = self._read_response(self.socket)
             print(f"Received response: {response_text}")
             
             return response_text
@@ -40,8 +132,87 @@ class SocketClient:
             print(f"Failed to send message: {e}")
             return None
     
+    def send_messages(self, messages):
+        """Pipeline several messages on the connection and collect the responses in order"""
+        try:
+            if not self.socket:
+                print("Not connected to the server")
+                return None
+            
+            # write every request before reading any response
+            self.socket.sendall(b''.join(pack_frame(m.encode('utf-8')) for m in messages))
+            return [self._read_response(self.socket) for _ in messages]
+            
+        except Exception as e:
+            print(f"Failed to send messages: {e}")
+            return None
+    
+    def send_batch(self, messages):
+        """Send many messages in one batch frame and return all the responses, in order"""
+        try:
+            if not self.socket:
+                print("Not connected to the server")
+                return None
+            
+            send_frame(self.socket, pack_batch([m.encode('utf-8') for m in messages]), FRAME_BATCH)
+            return self._read_response(self.socket, FRAME_BATCH)
+            
+        except Exception as e:
+            print(f"Failed to send batch: {e}")
+            return None
+    
+    def request(self, message):
+        """Send a message on a pooled persistent connection and return the response (thread-safe)"""
+        try:
+            return self._pooled_exchange(message.encode('utf-8'), FRAME_MESSAGE)
+        except Exception as e:
+            print(f"Failed to send message: {e}")
+            return None
+    
+    def request_batch(self, messages):
+        """Send a batch frame on a pooled persistent connection and return the responses (thread-safe)"""
+        try:
+            return self._pooled_exchange(pack_batch([m.encode('utf-8') for m in messages]), FRAME_BATCH)
+        except Exception as e:
+            print(f"Failed to send batch: {e}")
+            return None
+    
+    def _pooled_exchange(self, payload, frame_type):
+        # a reused connection may have been closed by the server since its health
+        # check, so a failure on one is retried on another, and finally on a new
+        # connection (uppercasing is idempotent, so a retried request is harmless)
+        while True:
+            sock, reused = self.pool.acquire()
+            try:
+                send_frame(sock, payload, frame_type)
+                response = self._read_response(sock, frame_type)
+            except OSError:
+                self.pool.release(sock, healthy=False)
+                if reused:
+                    continue
+                raise
+            except BaseException:
+                # e.g. an error frame: the server may close this connection next
+                self.pool.release(sock, healthy=False)
+                raise
+            self.pool.release(sock)
+            return response
+    
+    def _read_response(self, sock, expected_type=FRAME_MESSAGE):
+        frame = recv_frame(sock)
+        if frame is None:
+            raise ConnectionError("Server closed the connection")
+        frame_type, payload = frame
+        if frame_type == FRAME_ERROR:
+            raise ServerError(payload.decode('utf-8'))
+        if frame_type != expected_type:
+            raise ProtocolError(f"Unexpected frame type {frame_type}")
+        if frame_type == FRAME_BATCH:
+            return [str(item, 'utf-8') for item in unpack_batch(payload)]
+        return payload.decode('utf-8')
     
     def disconnect(self):
+        self.pool.close()
         if self.socket:
             self.socket.close()
             self.socket = None
@@ -82,8 +253,7 @@ class SocketClient:
         """Test connection establishment"""
         print("\n[Test 1] Connection establishment test")
         try:
-            sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
-            sock.connect((self.host, self.port))
+            sock = self.open_socket()
             print("Connection established successfully")
             sock.close()
             return True
@@ -95,13 +265,12 @@ class SocketClient:
         """Test message sending/receiving"""
         print("\n[Test 2] Message sending/receiving test")
         try:
-            sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
-            sock.connect((self.host, self.port))
+            sock = self.open_socket()
             
             # Test simple text - server converts to uppercase
             message = "Hello Socket Server"
-            sock.send(message.encode('utf-8'))
-            response = sock.recv(1024).decode('utf-8')
+            send_frame(sock, message.encode('utf-8'))
+            response = recv_frame(sock)[1].decode('utf-8')
             
             print(f"Sent: {message}")
             print(f"Received: {response}")
@@ -139,13 +308,8 @@ class SocketClient:
             for i, test_input in enumerate(test_cases):
                 print(f"\n  Sub-test {i+1}: '{test_input}'")
                 
-                # Create new connection for each test
-                sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
-                sock.connect((self.host, self.port))
-                
-                sock.send(test_input.encode('utf-8'))
-                response = sock.recv(1024).decode('utf-8')
-                sock.close()
+                # pooled persistent connection instead of a new one per sub-test
+                response = self.request(test_input)
                 
                 print(f"Sent: {test_input}")
                 print(f"Received: {response}")
@@ -218,13 +382,9 @@ class SocketClient:
             total_requests = 5
             
             for i in range(total_requests):
-                sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
-                sock.connect((self.host, self.port))
-                
                 # Simple text requests - all converted to uppercase
                 message = f"Request {i+1}"
-                sock.send(message.encode('utf-8'))
-                response = sock.recv(1024).decode('utf-8')
+                response = self.request(message)
                 
                 expected_result = message.upper()
                 if response == expected_result:
@@ -235,7 +395,6 @@ class SocketClient:
                     print(f"    Expected: {expected_result}")
                     print(f"    Actual: {response}")
                 
-                sock.close()
                 time.sleep(0.1)  # Small delay between requests
             
             print(f"\nSuccessful requests: {success_count}/{total_requests}")
@@ -250,6 +409,93 @@ class SocketClient:
             print(f"Multiple requests test failed: {e}")
             return False
     
+    def test_pipelined_requests(self):
+        """Test pipelined and large messages on one connection"""
+        print("\n[Test 6] Pipelined requests test")
+        try:
+            # one message well past the old 1024-byte recv limit plus many small ones
+            messages = ['large ' * 2000] + [f"pipelined {i}" for i in range(1000)]
+            
+            self.socket = self.open_socket()
+            responses = self.send_messages(messages)
+            self.disconnect()
+            
+            if responses == [m.upper() for m in messages]:
+                print(f"All {len(messages)} pipelined responses matched, in order")
+                return True
+            else:
+                print("Pipelined responses did not match")
+                return False
+                
+        except Exception as e:
+            print(f"Pipelined requests test failed: {e}")
+            return False
+    
+    def test_batch_requests(self):
+        """Test one batch frame carrying many messages"""
+        print("\n[Test 7] Batch requests test")
+        try:
+            # non-ASCII items check that results may differ in length from their input
+            messages = [f"batch item {i}" for i in range(10000)] + ['straße', 'ﬁx', '']
+            
+            self.socket = self.open_socket()
+            start = time.time()
+            responses = self.send_batch(messages)
+            elapsed = time.time() - start
+            self.disconnect()
+            
+            if responses == [m.upper() for m in messages]:
+                print(f"All {len(messages)} batch responses matched in {elapsed * 1000:.1f}ms")
+                return True
+            else:
+                print("Batch responses did not match")
+                return False
+                
+        except Exception as e:
+            print(f"Batch requests test failed: {e}")
+            return False
+    
+    def test_connection_pool(self):
+        """Test pooled persistent connections shared by several threads"""
+        print("\n[Test 8] Connection pool test")
+        try:
+            threads = 4
+            per_thread = 2000
+            failures = []
+            
+            def worker(n):
+                for i in range(per_thread):
+                    message = f"pooled {n}-{i}"
+                    if self.request(message) != message.upper():
+                        failures.append(message)
+            
+            start = time.time()
+            workers = [threading.Thread(target=worker, args=(n,)) for n in range(threads)]
+            for w in workers:
+                w.start()
+            for w in workers:
+                w.join()
+            elapsed = time.time() - start
+            print(f"{threads * per_thread} requests in {elapsed:.2f}s "
+                  f"({threads * per_thread / elapsed:.0f} msg/s) over {len(self.pool.idle)} connections")
+            
+            # a pooled connection the server has dropped must be replaced, not reported as an error
+            for sock, _ in self.pool.idle:
+                sock.shutdown(socket.SHUT_RDWR)
+            reconnected = self.request("after reconnect") == "AFTER RECONNECT"
+            self.pool.close()
+            
+            if not failures and reconnected and len(self.pool.idle) <= self.pool.max_size:
+                print("Connection pool test passed")
+                return True
+            else:
+                print(f"Connection pool test failed: {len(failures)} wrong responses, reconnected={reconnected}")
+                return False
+                
+        except Exception as e:
+            print(f"Connection pool test failed: {e}")
+            return False
+    
     def run_all_tests(self):
         """Run all tests"""
         print("="*50)
@@ -261,7 +507,10 @@ class SocketClient:
             self.test_message_sending_receiving,
             self.test_uppercase_conversion,
             self.test_error_handling_invalid_connection,
-            self.test_multiple_requests
+            self.test_multiple_requests,
+            self.test_pipelined_requests,
+            self.test_batch_requests,
+            self.test_connection_pool
         ]
         
         passed = 0
@@ -280,7 +529,8 @@ class SocketClient:
 
 
 if __name__ == "__main__":
-    client = SocketClient()
+    # a host name/IP, or unix:/path for a server on a Unix domain socket
+    client = SocketClient(host=os.environ.get('SERVER_HOST', 'localhost'))
     
     print("=== Socket Client ===")
     print("Choose mode:")
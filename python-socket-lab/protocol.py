@@ -0,0 +1,218 @@
+import socket
+import struct
+
+# Wire format shared by SocketServer and SocketClient:
+#   +-----------+----------------+-------------------+
+#   | type (1B) | length (4B BE) | payload (length B) |
+#   +-----------+----------------+-------------------+
+# Every request and response is one frame, so a single connection can carry
+# any number of back-to-back (pipelined) messages of any size.
+HEADER = struct.Struct('!BI')
+
+FRAME_MESSAGE = 1
+# sent by the server instead of a response, payload is a UTF-8 reason
+FRAME_ERROR = 2
+# many messages in one request (and their results in one response), payload:
+#   item count (4B BE), then for every item: length (4B BE) + UTF-8 bytes
+FRAME_BATCH = 3
+BATCH_LENGTH = struct.Struct('!I')
+
+# refuse absurd lengths instead of trying to allocate them
+MAX_FRAME_SIZE = 16 * 1024 * 1024
+
+# most platforms cap the number of buffers in one sendmsg() call at 1024
+IOV_MAX = 1024
+# below this many bytes, joining the buffers is cheaper than setting up a vectored write
+SMALL_WRITE_SIZE = 16 * 1024
+
+# initial size of a FrameReader buffer, it grows for larger frames and shrinks back afterwards
+RECV_BUFFER_SIZE = 64 * 1024
+
+
+# host value that selects a Unix domain socket instead of TCP, e.g. 'unix:/tmp/socket-lab.sock'
+UNIX_PREFIX = 'unix:'
+
+
+class ProtocolError(Exception):
+    """raised when the peer sends something that is not a valid frame"""
+
+
+class ServerError(Exception):
+    """raised on the client when the server answers with an error frame"""
+
+
+def parse_address(host, port):
+    """return (family, address) for a TCP host name/IP or a 'unix:/path' address"""
+    if host.startswith(UNIX_PREFIX):
+        return socket.AF_UNIX, host[len(UNIX_PREFIX):]
+    return socket.AF_INET, (host, port)
+
+
+def frame_buffers(payload, frame_type=FRAME_MESSAGE):
+    """return (header, payload) for one frame, to be written without joining them"""
+    if len(payload) > MAX_FRAME_SIZE:
+        raise ProtocolError(f"Frame of {len(payload)} bytes exceeds the {MAX_FRAME_SIZE} byte limit")
+    return HEADER.pack(frame_type, len(payload)), payload
+
+
+def pack_frame(payload, frame_type=FRAME_MESSAGE):
+    """build a complete frame (header + payload) ready to be sent"""
+    return b''.join(frame_buffers(payload, frame_type))
+
+
+def pack_batch(items):
+    """build the payload of a batch frame from a sequence of byte strings"""
+    parts = [BATCH_LENGTH.pack(len(items))]
+    for item in items:
+        parts.append(BATCH_LENGTH.pack(len(item)))
+        parts.append(item)
+    return b''.join(parts)
+
+
+def unpack_batch(payload):
+    """split a batch payload into its items, as memoryviews into payload (no copies)"""
+    view = memoryview(payload)
+    if len(view) < BATCH_LENGTH.size:
+        raise ProtocolError("Batch payload is missing its item count")
+    count, = BATCH_LENGTH.unpack_from(view)
+    # every item takes at least its length field, so this also bounds the loop
+    if count * BATCH_LENGTH.size > len(view) - BATCH_LENGTH.size:
+        raise ProtocolError(f"Batch of {count} items does not fit in {len(view)} bytes")
+    
+    items = []
+    offset = BATCH_LENGTH.size
+    for _ in range(count):
+        if offset + BATCH_LENGTH.size > len(view):
+            raise ProtocolError("Batch payload ends in the middle of an item")
+        length, = BATCH_LENGTH.unpack_from(view, offset)
+        offset += BATCH_LENGTH.size
+        if offset + length > len(view):
+            raise ProtocolError("Batch payload ends in the middle of an item")
+        items.append(view[offset:offset + length])
+        offset += length
+    if offset != len(view):
+        raise ProtocolError(f"{len(view) - offset} trailing bytes after the last batch item")
+    return items
+
+
+def unpack_header(header, offset=0):
+    """return (frame_type, length) for a raw header, validating the length"""
+    frame_type, length = HEADER.unpack_from(header, offset)
+    if length > MAX_FRAME_SIZE:
+        raise ProtocolError(f"Frame of {length} bytes exceeds the {MAX_FRAME_SIZE} byte limit")
+    return frame_type, length
+
+
+def recv_exact(sock, size):
+    """read exactly size bytes, or return None if the peer closed the connection"""
+    buffer = bytearray(size)
+    view = memoryview(buffer)
+    received = 0
+    while received < size:
+        n = sock.recv_into(view[received:], size - received)
+        if n == 0:
+            if received:
+                raise ProtocolError("Connection closed in the middle of a frame")
+            return None
+        received += n
+    # hand out the buffer recv_into filled rather than copying it into bytes
+    return buffer
+
+
+class FrameReader:
+    """reads frames from a blocking socket into one reusable buffer per connection
+    
+    every recv_into() fills as much of the buffer as the socket has ready, so
+    pipelined frames are parsed without a system call each, and payloads are
+    handed out as memoryviews into the buffer instead of fresh bytes objects
+    """
+    
+    def __init__(self, sock, size=RECV_BUFFER_SIZE):
+        self.sock = sock
+        self.size = size
+        self._allocate(size)
+    
+    def _allocate(self, size, keep=b''):
+        """switch to a new buffer of the given size that starts with the keep bytes"""
+        self.buffer = bytearray(size)
+        self.buffer[:len(keep)] = keep
+        self.view = memoryview(self.buffer)
+        # unread data is buffer[start:end]
+        self.start = 0
+        self.end = len(keep)
+    
+    def _fill(self, size):
+        """make sure size unread bytes are buffered; False if the peer closed first"""
+        while self.end - self.start < size:
+            if self.start + size > len(self.buffer):
+                unread = self.buffer[self.start:self.end]
+                if size > len(self.buffer):
+                    # a frame larger than the buffer: grow, at least doubling
+                    self._allocate(max(size, 2 * len(self.buffer)), unread)
+                else:
+                    # move the unread tail to the front (same size, so existing views stay valid)
+                    self.buffer[:len(unread)] = unread
+                    self.start, self.end = 0, len(unread)
+            
+            n = self.sock.recv_into(self.view[self.end:])
+            if n == 0:
+                return False
+            self.end += n
+        return True
+    
+    def read_frame(self):
+        """receive one frame; returns (frame_type, payload) or None on clean close
+        
+        the payload is a memoryview into the buffer and is only valid until the next call
+        """
+        if len(self.buffer) > self.size and self.end - self.start <= self.size:
+            # the large frame that grew the buffer is done with, give the memory back
+            self._allocate(self.size, self.buffer[self.start:self.end])
+        
+        if not self._fill(HEADER.size):
+            if self.end > self.start:
+                raise ProtocolError("Connection closed in the middle of a frame")
+            return None
+        frame_type, length = unpack_header(self.buffer, self.start)
+        if not self._fill(HEADER.size + length):
+            raise ProtocolError("Connection closed in the middle of a frame")
+        
+        payload_start = self.start + HEADER.size
+        self.start = payload_start + length
+        return frame_type, self.view[payload_start:self.start]
+
+
+def send_buffers(sock, buffers):
+    """send a sequence of buffers with vectored writes (sendmsg) on a blocking socket"""
+    if not hasattr(sock, 'sendmsg') or sum(map(len, buffers)) <= SMALL_WRITE_SIZE:
+        sock.sendall(b''.join(buffers))
+        return
+    views = [memoryview(buffer).cast('B') for buffer in buffers if len(buffer)]
+    index = 0
+    while index < len(views):
+        sent = sock.sendmsg(views[index:index + IOV_MAX])
+        # skip the buffers that went out completely, resume inside a partly sent one
+        while sent:
+            if sent >= len(views[index]):
+                sent -= len(views[index])
+                index += 1
+            else:
+                views[index] = views[index][sent:]
+                sent = 0
+
+
+def send_frame(sock, payload, frame_type=FRAME_MESSAGE):
+    """send one frame on a blocking socket"""
+    send_buffers(sock, frame_buffers(payload, frame_type))
+
+
+def recv_frame(sock):
+    """receive one frame; returns (frame_type, payload) or None on clean close"""
+    header = recv_exact(sock, HEADER.size)
+    if header is None:
+        return None
+    frame_type, length = unpack_header(header)
+    payload = recv_exact(sock, length) if length else b''
+    if payload is None:
+        raise ProtocolError("Connection closed in the middle of a frame")
+    return frame_type, payload
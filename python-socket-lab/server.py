@@ -1,85 +1,481 @@
+import asyncio
+import logging
+import multiprocessing
+import multiprocessing.connection
+import os
+import selectors
+import signal
 import socket
+import stat
 import threading
 import time
+from collections import deque
+from logsetup import setup_logging
+from protocol import (FRAME_BATCH, FRAME_ERROR, FRAME_MESSAGE, HEADER, FrameReader, ProtocolError,
+                      frame_buffers, pack_batch, pack_frame, parse_address, send_buffers, unpack_batch,
+                      unpack_header)
+
+# thread: bounded worker pool, one worker per client, asyncio: single-threaded event loop,
+# selector: hand-rolled non-blocking reactor on top of selectors (epoll on Linux)
+SERVER_MODES = ('thread', 'asyncio', 'selector')
+
+logger = logging.getLogger('socket-server')
+
+# how much to read from a ready socket in one recv call (selector mode)
+RECV_CHUNK_SIZE = 64 * 1024
+# a client whose unsent responses pass the high-water mark is not read from
+# until they drain below the low-water mark, so a client that pipelines requests
+# without reading the answers cannot grow the server's memory (selector mode)
+OUTBUF_HIGH_WATER = 1024 * 1024
+OUTBUF_LOW_WATER = 256 * 1024
+
+class Connection:
+    """per-client state for the selector reactor"""
+    __slots__ = ('sock', 'address', 'inbuf', 'outbuf', 'events')
+    
+    def __init__(self, sock, address):
+        self.sock = sock
+        self.address = address
+        self.inbuf = bytearray()
+        self.outbuf = bytearray()
+        # the events the selector watches for this socket
+        self.events = selectors.EVENT_READ
+
+# sent to clients turned away because every worker and queue slot is taken
+BUSY_MESSAGE = b'Server busy, try again later'
+
+# multi-process mode: pause before restarting a crashed worker process, so a
+# worker that dies on startup (e.g. the port is taken) does not spin the supervisor
+WORKER_RESTART_DELAY = 1.0
 
 class SocketServer:
-    def __init__(self, host='0.0.0.0', port=8080):
+    def __init__(self, host='0.0.0.0', port=8080, mode='thread',
+                 backlog=128, max_workers=64, max_pending=128,
+                 queue_timeout=1.0, idle_timeout=30.0, processes=1):
+        if mode not in SERVER_MODES:
+            raise ValueError(f"Unknown server mode '{mode}', expected one of {SERVER_MODES}")
+        # 0 means one worker process per CPU core
+        processes = processes or os.cpu_count() or 1
+        # host may also be 'unix:/path' to serve on a Unix domain socket instead of TCP
+        self.family, self.address = parse_address(host, port)
+        if processes > 1 and self.family == socket.AF_INET and not hasattr(socket, 'SO_REUSEPORT'):
+            raise ValueError("Multiple worker processes need SO_REUSEPORT, which this platform lacks")
         self.host = host
         self.port = port
+        self.mode = mode
+        # kernel accept queue length
+        self.backlog = backlog
+        # thread mode: clients served at once, and accepted clients allowed to wait for a worker
+        self.max_workers = max_workers
+        self.max_pending = max_pending
+        # thread mode: seconds a client may wait for a worker, and may stay silent once it has one
+        self.queue_timeout = queue_timeout
+        self.idle_timeout = idle_timeout
+        # worker processes that each bind the port with SO_REUSEPORT and run their
+        # own accept loop, so process_message is no longer limited to one core by the GIL
+        self.processes = processes
+        self.worker_processes = {}
         self.server_socket = None
+        # only the process that bound a Unix socket path removes it again
+        self.unix_path_owner = None
+        self.pending_clients = deque()
+        self.pending_changed = threading.Condition()
         self.running = False
         
     def start(self):
         """start the server"""
         try:
-            # create TCP/IP Socket
-            self.server_socket = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+            self.running = True
+            if self.processes > 1:
+                self.serve_processes()
+            else:
+                self.serve()
+                    
+        except Exception as e:
+            logger.error("Failed to start the server: %s", e)
+        finally:
+            self.stop()
+    
+    def serve(self):
+        """bind the listening socket and run the accept loop of the configured mode"""
+        if self.server_socket is None:
+            self.server_socket = self.create_server_socket()
+        
+        logger.info("Server started successfully (%s mode). Listening on %s", self.mode, self.describe_address())
+        logger.info("waiting for client connection...")
+        
+        if self.mode == 'asyncio':
+            asyncio.run(self.serve_asyncio())
+        elif self.mode == 'selector':
+            self.serve_selector()
+        else:
+            self.serve_threaded()
+    
+    def serve_processes(self):
+        """supervisor: keep `processes` worker processes running, restarting any that die"""
+        # docker stop sends SIGTERM; turn it into KeyboardInterrupt so stop() reaps the workers
+        signal.signal(signal.SIGTERM, signal.default_int_handler)
+        # fork, not spawn: workers inherit the configured server as is (SO_REUSEPORT is Linux/BSD only anyway)
+        context = multiprocessing.get_context('fork')
+        if self.family == socket.AF_UNIX:
+            # SO_REUSEPORT does not apply to Unix sockets: bind once here and let
+            # the forked workers accept from the inherited listening socket
+            self.server_socket = self.create_server_socket()
+        for index in range(self.processes):
+            self.worker_processes[index] = self.spawn_worker(context, index)
+        logger.info("Supervisor started %d worker processes (%s mode) on %s",
+                    self.processes, self.mode, self.describe_address())
+        
+        while self.running:
+            sentinels = [worker.sentinel for worker in self.worker_processes.values()]
+            exited = multiprocessing.connection.wait(sentinels)
+            for index, worker in list(self.worker_processes.items()):
+                if worker.sentinel not in exited:
+                    continue
+                worker.join()
+                logger.warning("Worker process %s exited with code %s, restarting", worker.pid, worker.exitcode)
+                time.sleep(WORKER_RESTART_DELAY)
+                self.worker_processes[index] = self.spawn_worker(context, index)
+    
+    def spawn_worker(self, context, index):
+        """start one worker process (multi-process mode)"""
+        worker = context.Process(target=self.run_worker, name=f"socket-process-{index}")
+        worker.daemon = True
+        worker.start()
+        return worker
+    
+    def run_worker(self):
+        """entry point of a worker process: bind with SO_REUSEPORT and serve until killed"""
+        # the forked copy must not manage its siblings or handle SIGTERM like the supervisor
+        self.worker_processes = {}
+        signal.signal(signal.SIGTERM, signal.SIG_DFL)
+        # fork does not copy the log listener thread, so start one for this process
+        setup_logging()
+        try:
+            self.serve()
+        except KeyboardInterrupt:
+            pass
+        finally:
+            self.stop()
+    
+    def create_server_socket(self):
+        """create, bind and listen on the server socket shared by all modes"""
+        # create TCP/IP or Unix domain stream Socket
+        server_socket = socket.socket(self.family, socket.SOCK_STREAM)
+        if self.family == socket.AF_UNIX:
+            # a path left behind by a server that did not shut down cleanly blocks bind()
+            if os.path.exists(self.address) and stat.S_ISSOCK(os.stat(self.address).st_mode):
+                os.unlink(self.address)
+            self.unix_path_owner = os.getpid()
+        else:
             # Enable address reuse to prevent "Address already in use" errors
-            self.server_socket.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+            server_socket.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+            if self.processes > 1:
+                # every worker process binds the same port, the kernel spreads connections between them
+                server_socket.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEPORT, 1)
+    
+        # bind to localhost:8080 or the socket path
+        server_socket.bind(self.address)
         
-            # bind to localhost:8080
-            self.server_socket.bind((self.host, self.port))
-            
-            # listen for connections
-            self.server_socket.listen(5)
-            self.running = True
+        # listen for connections
+        server_socket.listen(self.backlog)
+        return server_socket
+    
+    def describe_address(self):
+        """the listening address for log messages"""
+        if self.family == socket.AF_UNIX:
+            return self.host
+        return f"{self.host}:{self.port}"
+    
+    def serve_threaded(self):
+        """accept loop that hands clients to a bounded pool of worker threads"""
+        for i in range(self.max_workers):
+            worker = threading.Thread(target=self.worker_loop, name=f"socket-worker-{i}")
+            worker.daemon = True
+            worker.start()
+        reaper = threading.Thread(target=self.reap_pending_clients, name="socket-reaper")
+        reaper.daemon = True
+        reaper.start()
+        
+        while self.running:
+            try:
+                # accept client connection
+                client_socket, client_address = self.server_socket.accept()
+                
+                # admission control: fail fast instead of queueing without bound
+                with self.pending_changed:
+                    admitted = len(self.pending_clients) < self.max_pending
+                    if admitted:
+                        self.pending_clients.append((client_socket, client_address, time.monotonic()))
+                        self.pending_changed.notify()
+                if not admitted:
+                    self.reject_client(client_socket, client_address)
+                    continue
+                
+                logger.debug("Built connection for new client: %s", client_address)
+                
+            except socket.error as e:
+                if self.running:
+                    logger.error("socket error: %s", e)
+                break
+    
+    def worker_loop(self):
+        """take queued clients one at a time and serve each until it disconnects"""
+        while True:
+            with self.pending_changed:
+                while not self.pending_clients:
+                    self.pending_changed.wait()
+                client_socket, client_address, queued_at = self.pending_clients.popleft()
             
-            print(f"Server started successfully. Listening on {self.host}:{self.port}")
-            print("waiting for client connection...")
+            # idle clients must not hold a worker forever
+            client_socket.settimeout(self.idle_timeout)
+            self.handle_client(client_socket, client_address)
+    
+    def reap_pending_clients(self):
+        """reject queued clients that waited longer than queue_timeout for a worker"""
+        while True:
+            time.sleep(max(self.queue_timeout / 4, 0.05))
+            deadline = time.monotonic() - self.queue_timeout
+            expired = []
+            with self.pending_changed:
+                # the queue is FIFO, so the oldest clients are always at the front
+                while self.pending_clients and self.pending_clients[0][2] < deadline:
+                    expired.append(self.pending_clients.popleft())
+            for client_socket, client_address, _ in expired:
+                self.reject_client(client_socket, client_address)
+    
+    def reject_client(self, client_socket, client_address):
+        """answer with an error frame and close, without blocking the caller"""
+        logger.info("Rejected client %s: server busy", client_address)
+        try:
+            # drop the frame rather than wait on a client that is not reading
+            client_socket.setblocking(False)
+            client_socket.send(pack_frame(BUSY_MESSAGE, FRAME_ERROR))
+            # half-close and discard what the client already sent, so close()
+            # does not turn into a RST that destroys the error frame
+            client_socket.shutdown(socket.SHUT_WR)
+            while client_socket.recv(RECV_CHUNK_SIZE):
+                pass
+        except OSError:
+            pass
+        finally:
+            client_socket.close()
+    
+    async def serve_asyncio(self):
+        """serve every client from one event loop instead of one thread each"""
+        server = await asyncio.start_server(self.handle_client_async, sock=self.server_socket)
+        async with server:
+            await server.serve_forever()
             
+    def serve_selector(self):
+        """single-threaded reactor: non-blocking sockets multiplexed by one selector"""
+        # selectors is level-triggered, so every handler drains its socket until
+        # it would block (or its buffer is full) and EVENT_WRITE is only watched
+        # while output is pending
+        selector = selectors.DefaultSelector()
+        self.server_socket.setblocking(False)
+        selector.register(self.server_socket, selectors.EVENT_READ, None)
+        try:
             while self.running:
+                for key, events in selector.select():
+                    conn = key.data
+                    if conn is None:
+                        self.accept_ready(selector)
+                        continue
+                    if events & selectors.EVENT_READ:
+                        self.read_ready(selector, conn)
+                    if events & selectors.EVENT_WRITE and conn.sock.fileno() != -1:
+                        self.write_ready(selector, conn)
+        finally:
+            selector.close()
+    
+    def accept_ready(self, selector):
+        """accept every pending connection (selector mode)"""
+        while True:
+            try:
+                client_socket, client_address = self.server_socket.accept()
+            except BlockingIOError:
+                return
+            logger.debug("Built connection for new client: %s", client_address)
+            client_socket.setblocking(False)
+            selector.register(client_socket, selectors.EVENT_READ, Connection(client_socket, client_address))
+    
+    def read_ready(self, selector, conn):
+        """read everything available, answer every complete frame (selector mode)"""
+        try:
+            while True:
                 try:
-                    # accept client connection
-                    client_socket, client_address = self.server_socket.accept()
-                    print(f"Built connection for new client: {client_address}")
-                    
-                    # create new thread for every client 
-                    client_thread = threading.Thread(
-                        target=self.handle_client, 
-                        args=(client_socket, client_address)
-                    )
-                    client_thread.daemon = True
-                    client_thread.start()
-                    
-                except socket.error as e:
-                    if self.running:
-                        print(f"socket error: {e}")
+                    data = conn.sock.recv(RECV_CHUNK_SIZE)
+                except BlockingIOError:
                     break
-                    
-        except Exception as e:
-            print(f"Failed to start the server: {e}")
-        finally:
-            self.stop()
+                if not data:
+                    logger.debug("Client %s disconnected", conn.address)
+                    self.close_connection(selector, conn)
+                    return
+                conn.inbuf += data
+                # the rest is read on the next round, after these frames are answered
+                if len(data) < RECV_CHUNK_SIZE or len(conn.inbuf) >= OUTBUF_HIGH_WATER:
+                    break
+            
+            # answer every complete frame in the buffer, in order
+            inbuf = conn.inbuf
+            offset = 0
+            while len(inbuf) - offset >= HEADER.size:
+                frame_type, length = unpack_header(inbuf, offset)
+                end = offset + HEADER.size + length
+                if len(inbuf) < end:
+                    break
+                
+                payload = inbuf[offset + HEADER.size:end]
+                logger.debug("Received message from %s:%r", conn.address, payload)
+                for buffer in self.answer_frame(frame_type, payload, conn.address):
+                    conn.outbuf += buffer
+                offset = end
+            del inbuf[:offset]
             
+            if conn.outbuf:
+                self.write_ready(selector, conn)
+                
+        except ConnectionResetError:
+            logger.debug("Client %s forcibly closed the connection", conn.address)
+            self.close_connection(selector, conn)
+        except ProtocolError as e:
+            logger.warning("Protocol error from client %s: %s", conn.address, e)
+            self.close_connection(selector, conn)
+        except Exception as e:
+            logger.error("Error while handling client %s: %s", conn.address, e)
+            self.close_connection(selector, conn)
+    
+    def write_ready(self, selector, conn):
+        """flush as much pending output as the socket accepts (selector mode)"""
+        try:
+            while conn.outbuf:
+                try:
+                    sent = conn.sock.send(conn.outbuf)
+                except BlockingIOError:
+                    break
+                del conn.outbuf[:sent]
+        except OSError as e:
+            logger.warning("Error while sending to client %s: %s", conn.address, e)
+            self.close_connection(selector, conn)
+            return
+        
+        # only ask for writability while there is something left to send, and
+        # stop reading while too much is (never both off: outbuf is not empty then)
+        pending = len(conn.outbuf)
+        reading = conn.events & selectors.EVENT_READ
+        if reading and pending > OUTBUF_HIGH_WATER:
+            reading = 0
+            logger.debug("Client %s is not reading its responses, pausing it", conn.address)
+        elif not reading and pending <= OUTBUF_LOW_WATER:
+            reading = selectors.EVENT_READ
+        events = reading | (selectors.EVENT_WRITE if pending else 0)
+        if events != conn.events:
+            conn.events = events
+            selector.modify(conn.sock, events, conn)
+    
+    def close_connection(self, selector, conn):
+        """unregister and close a client socket (selector mode)"""
+        if conn.sock.fileno() == -1:
+            return
+        selector.unregister(conn.sock)
+        conn.sock.close()
+        logger.debug("Closed connection with %s", conn.address)
+    
     def handle_client(self, client_socket, client_address):
         """deal request from client"""
+        # one receive buffer for the whole connection, payloads are views into it
+        frames = FrameReader(client_socket)
         try:
             while True:
-                # receive data from the client
-                data = client_socket.recv(1024)
+                # receive one complete frame from the client
+                frame = frames.read_frame()
                 
-                if not data:
-                    print(f"Client {client_address} disconnected")
+                if frame is None:
+                    logger.debug("Client %s disconnected", client_address)
                     break
                 
-                # decode the received data
-                message = data.decode('utf-8')
-                print(f"Received message from {client_address}:{message}")
-                
-                # process the request 
-                response = self.process_message(message, client_address)
+                frame_type, payload = frame
+                if logger.isEnabledFor(logging.DEBUG):
+                    logger.debug("Received message from %s:%r", client_address, payload.tobytes())
                 
-                # send the response
-                client_socket.send(response.encode('utf-8'))
+                # process the request and send the response (frames are answered in the order they arrive)
+                send_buffers(client_socket, self.answer_frame(frame_type, payload, client_address))
                 
                 
+        except socket.timeout:
+            logger.debug("Client %s was idle for %ss, closing", client_address, self.idle_timeout)
         except ConnectionResetError:
-            print(f"Client {client_address} forcibly closed the connection")
+            logger.debug("Client %s forcibly closed the connection", client_address)
+        except ProtocolError as e:
+            logger.warning("Protocol error from client %s: %s", client_address, e)
         except Exception as e:
-            print(f"Error while handling client {client_address}: {e}")
+            logger.error("Error while handling client %s: %s", client_address, e)
         finally:
             client_socket.close()
-            print(f"Closed connection with {client_address}v")
+            logger.debug("Closed connection with %s", client_address)
+    
+    async def handle_client_async(self, reader, writer):
+        """deal request from client on the event loop (asyncio mode)"""
+        client_address = writer.get_extra_info('peername')
+        logger.debug("Built connection for new client: %s", client_address)
+        try:
+            while True:
+                # receive one complete frame from the client
+                try:
+                    header = await reader.readexactly(HEADER.size)
+                except asyncio.IncompleteReadError as e:
+                    if e.partial:
+                        raise ProtocolError("Connection closed in the middle of a frame")
+                    logger.debug("Client %s disconnected", client_address)
+                    break
+                
+                frame_type, length = unpack_header(header)
+                payload = await reader.readexactly(length)
+                logger.debug("Received message from %s:%r", client_address, payload)
+                
+                # queue the response and only wait when the transport buffer is full
+                writer.writelines(self.answer_frame(frame_type, payload, client_address))
+                await writer.drain()
+                
+        except (ConnectionResetError, asyncio.IncompleteReadError):
+            logger.debug("Client %s forcibly closed the connection", client_address)
+        except ProtocolError as e:
+            logger.warning("Protocol error from client %s: %s", client_address, e)
+        except Exception as e:
+            logger.error("Error while handling client %s: %s", client_address, e)
+        finally:
+            writer.close()
+            logger.debug("Closed connection with %s", client_address)
+    
+    def answer_frame(self, frame_type, payload, client_address):
+        """process one request frame and return the response frame as (header, payload) buffers"""
+        if frame_type not in (FRAME_MESSAGE, FRAME_BATCH):
+            raise ProtocolError(f"Unknown frame type {frame_type}")
+        try:
+            if frame_type == FRAME_BATCH:
+                results = [self.process_payload(item, client_address) for item in unpack_batch(payload)]
+                return frame_buffers(pack_batch(results), FRAME_BATCH)
+            return frame_buffers(self.process_payload(payload, client_address))
+        except UnicodeDecodeError as e:
+            # framing is still intact, so only this request fails, not the connection
+            logger.warning("Invalid UTF-8 from client %s: %s", client_address, e)
+            return frame_buffers(f"Invalid UTF-8 payload: {e}".encode('utf-8'), FRAME_ERROR)
+        except ProtocolError as e:
+            # a malformed batch is confined to its own frame as well
+            logger.warning("Invalid batch from client %s: %s", client_address, e)
+            return frame_buffers(f"Invalid batch: {e}".encode('utf-8'), FRAME_ERROR)
+    
+    def process_payload(self, payload, client_address):
+        """process one raw message (bytes, bytearray or memoryview) and return the response bytes"""
+        # bytes() is free for bytes and a single copy out of a receive buffer otherwise
+        data = bytes(payload)
+        if data.isascii():
+            # ASCII fast path: bytes.upper() matches str.upper() here and never decodes to str
+            return data.upper()
+        
+        response = self.process_message(data.decode('utf-8'), client_address)
+        return response.encode('utf-8')
     
     def process_message(self, message, client_address):
         """business logic for processing messages - only uppercase conversion"""
@@ -94,17 +490,40 @@ class SocketServer:
     def stop(self):
         """stop server"""
         self.running = False
+        workers = list(self.worker_processes.values())
+        self.worker_processes = {}
+        for worker in workers:
+            worker.terminate()
+        for worker in workers:
+            worker.join()
         if self.server_socket:
             try:
                 self.server_socket.close()
-                print("Server stopped")
+                logger.info("Server stopped")
             except:
                 pass
+        if self.unix_path_owner == os.getpid():
+            self.unix_path_owner = None
+            try:
+                os.unlink(self.address)
+            except OSError:
+                pass
 
 if __name__ == "__main__":
-    server = SocketServer()
+    setup_logging()
+    server = SocketServer(
+        # a host name/IP, or unix:/path for a Unix domain socket
+        host=os.environ.get('SERVER_HOST', '0.0.0.0'),
+        mode=os.environ.get('SERVER_MODE', 'thread'),
+        backlog=int(os.environ.get('SERVER_BACKLOG', 128)),
+        max_workers=int(os.environ.get('SERVER_MAX_WORKERS', 64)),
+        max_pending=int(os.environ.get('SERVER_MAX_PENDING', 128)),
+        queue_timeout=float(os.environ.get('SERVER_QUEUE_TIMEOUT', 1.0)),
+        idle_timeout=float(os.environ.get('SERVER_IDLE_TIMEOUT', 30.0)),
+        processes=int(os.environ.get('SERVER_PROCESSES', 1))
+    )
     try:
         server.start()
     except KeyboardInterrupt:
-        print("\n Closing the server...")
+        logger.info("Closing the server...")
         server.stop()
\ No newline at end of file